@@ -5,6 +5,7 @@ import { getPlanById } from '@/lib/crypto/plans'
 import type { FaceswapSettings } from '@/lib/supabase/types'
 
 export async function POST(request: Request) {
+  let quotaUnitsConsumed = 0
   try {
     const { jobId } = await request.json()
 
@@ -56,6 +57,12 @@ export async function POST(request: Request) {
       return NextResponse.json({ error: 'Profile not found' }, { status: 404 })
     }
 
+    // Batch image jobs: every source image must belong to the user
+    const batchImages = (job.settings as FaceswapSettings).images
+    if (batchImages?.some((path) => !path.startsWith(`${user.id}/`))) {
+      return NextResponse.json({ error: 'Invalid file path' }, { status: 403 })
+    }
+
     // --- PLAN ENFORCEMENT ---
 
     // Check plan expiry
@@ -73,8 +80,32 @@ export async function POST(request: Request) {
       profile.quota_used = 0
     }
 
-    // Check faceswap-specific monthly limit
     const planConfig = getPlanById(profile.plan)
+    const settings = job.settings as FaceswapSettings
+
+    // Batch image jobs: the number of source images is capped per plan (a
+    // large batch would also outrun the worker timeout), and every output
+    // counts against the plan's variant limit
+    const maxVariants = planConfig?.variantLimit ?? 10
+    if (batchImages) {
+      const maxBatchImages = planConfig?.faceswapBatchLimit ?? 5
+      if (batchImages.length === 0 || batchImages.length > maxBatchImages) {
+        return NextResponse.json(
+          { error: `A batch can have 1-${maxBatchImages} images on your plan.` },
+          { status: 400 }
+        )
+      }
+
+      const totalOutputs = batchImages.length * (settings.swap_only ? 1 : settings.variant_count)
+      if (totalOutputs > maxVariants) {
+        return NextResponse.json(
+          { error: `This batch would create ${totalOutputs} outputs; your plan allows ${maxVariants} per job.` },
+          { status: 400 }
+        )
+      }
+    }
+
+    // Check faceswap-specific monthly limit
     const faceswapLimit = planConfig?.faceswapLimit ?? 2
 
     // Count faceswap jobs this month
@@ -97,9 +128,12 @@ export async function POST(request: Request) {
       )
     }
 
-    // Atomic quota consumption (shared quota for all job types)
+    // Atomic quota consumption (shared quota for all job types); a batch
+    // uses one unit per source image, like that many single-image jobs
+    const quotaUnits = batchImages?.length ?? 1
     const { data: quotaConsumed } = await serviceClient.rpc('try_consume_quota', {
       p_user_id: user.id,
+      p_amount: quotaUnits,
     })
 
     if (!quotaConsumed) {
@@ -108,11 +142,9 @@ export async function POST(request: Request) {
         { status: 403 }
       )
     }
+    quotaUnitsConsumed = quotaUnits
 
     // Enforce variant count limit based on plan
-    const maxVariants = planConfig?.variantLimit ?? 10
-    const settings = job.settings as FaceswapSettings
-
     if (!settings.swap_only && settings.variant_count > maxVariants) {
       settings.variant_count = maxVariants
       await serviceClient
@@ -144,6 +176,7 @@ export async function POST(request: Request) {
       facePath: settings.face_path,
       variantCount: settings.swap_only ? 0 : settings.variant_count,
       swapOnly: settings.swap_only,
+      images: settings.source_type === 'image' ? settings.images : undefined,
       userId: job.user_id,
     })
 
@@ -156,7 +189,7 @@ export async function POST(request: Request) {
         })
         .eq('id', jobId)
 
-      await serviceClient.rpc('refund_quota', { p_user_id: user.id })
+      await serviceClient.rpc('refund_quota', { p_user_id: user.id, p_amount: quotaUnits })
 
       return NextResponse.json(
         { error: result.error || 'Failed to start processing' },
@@ -174,9 +207,9 @@ export async function POST(request: Request) {
     try {
       const supabase = await createClient()
       const { data: { user } } = await supabase.auth.getUser()
-      if (user) {
+      if (user && quotaUnitsConsumed > 0) {
         const serviceClient = createServiceClient()
-        await serviceClient.rpc('refund_quota', { p_user_id: user.id })
+        await serviceClient.rpc('refund_quota', { p_user_id: user.id, p_amount: quotaUnitsConsumed })
       }
     } catch { /* best-effort */ }
     return NextResponse.json(
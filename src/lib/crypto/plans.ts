@@ -8,6 +8,7 @@ export interface Plan {
   quota: number
   variantLimit: number
   faceswapLimit: number
+  faceswapBatchLimit: number
   popular?: boolean
 }
 
@@ -22,6 +23,7 @@ export const PLANS: Plan[] = [
     quota: 5,
     variantLimit: 10,
     faceswapLimit: 2,
+    faceswapBatchLimit: 5,
     features: [
       '5 projects per month',
       '10 variants per project',
@@ -40,6 +42,7 @@ export const PLANS: Plan[] = [
     quota: 100,
     variantLimit: 10000,
     faceswapLimit: 50,
+    faceswapBatchLimit: 25,
     popular: true,
     features: [
       '100 projects per month',
@@ -61,6 +64,7 @@ export const PLANS: Plan[] = [
     quota: 10000,
     variantLimit: 10000,
     faceswapLimit: 10000,
+    faceswapBatchLimit: 50,
     features: [
       'Unlimited projects',
       'Unlimited variants',
@@ -48,6 +48,7 @@ interface ModalFaceswapJobRequest {
   variantCount: number
   swapOnly: boolean
   userId: string
+  images?: string[]
 }
 
 interface ModalImageJobRequest {
@@ -234,6 +235,7 @@ export async function triggerFaceswapProcessing(
         face_path: request.facePath,
         variant_count: request.variantCount,
         swap_only: request.swapOnly,
+        images: request.images,
         user_id: request.userId,
         supabase_url: supabaseUrl,
         supabase_key: supabaseKey,
@@ -42,6 +42,7 @@ export interface FaceswapSettings {
   source_type: 'video' | 'image'
   swap_only: boolean
   variant_count: number
+  images?: string[]
 }
 
 export interface MultiplySettings {
@@ -195,6 +196,7 @@ export interface Database {
           transformations: Json | null
           file_hash: string | null
           caption_text: string | null
+          variant_index: number | null
           created_at: string
         }
         Insert: {
@@ -205,6 +207,7 @@ export interface Database {
           transformations?: Json | null
           file_hash?: string | null
           caption_text?: string | null
+          variant_index?: number | null
           created_at?: string
         }
         Update: {
@@ -215,6 +218,7 @@ export interface Database {
           transformations?: Json | null
           file_hash?: string | null
           caption_text?: string | null
+          variant_index?: number | null
           created_at?: string
         }
       }
@@ -452,11 +456,11 @@ export interface Database {
         Returns: undefined
       }
       try_consume_quota: {
-        Args: { p_user_id: string }
+        Args: { p_user_id: string; p_amount?: number }
         Returns: boolean
       }
       refund_quota: {
-        Args: { p_user_id: string }
+        Args: { p_user_id: string; p_amount?: number }
         Returns: undefined
       }
     }
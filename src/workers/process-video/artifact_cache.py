@@ -0,0 +1,403 @@
+"""
+Content-addressed artifact cache shared across jobs.
+
+The same sources are processed over and over (clean then captions, several
+caption jobs on one photo, re-multiplying a parent carousel), so raw
+downloads and derived artifacts are kept on a persistent directory - a
+Modal Volume in production, any directory locally:
+
+- raw/: downloaded objects, keyed by (bucket, path, ETag)
+- <kind>/: derived artifacts (fitted caption bases, probe results, encoded
+  variants, ...), keyed by a content hash of their input plus the
+  parameters used
+
+Total size is bounded with LRU eviction, and hits, misses, evictions and
+bytes are counted. Sizes and last-use times live in a small JSON index
+(index.json) persisted with the directory and updated incrementally, so
+neither opening the cache nor evicting walks the tree; the tree is only
+scanned to rebuild a missing or unreadable index. Containers sharing the
+volume merge their index into the one on disk when they commit.
+A cache opened without a directory is a pass-through that stores nothing.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from PIL import Image
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+# Evict down to this fraction of the bound so eviction is not run per put
+_EVICT_TARGET = 0.9
+
+_IMAGE_MAGIC = b"IMG1"
+
+_INDEX_NAME = "index.json"
+
+
+def content_key(*parts: Any) -> str:
+    """Stable hex key for parts (bytes are hashed by content)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(b"b")
+            h.update(hashlib.sha256(part).digest())
+        else:
+            h.update(b"s")
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _encode_image(img: Image.Image) -> bytes:
+    header = _IMAGE_MAGIC + img.mode.encode().ljust(8) + struct.pack("<II", img.width, img.height)
+    return header + img.tobytes()
+
+
+def _decode_image(data: bytes) -> Optional[Image.Image]:
+    if data[:4] != _IMAGE_MAGIC:
+        return None
+    mode = data[4:12].decode().strip()
+    width, height = struct.unpack("<II", data[12:20])
+    return Image.frombytes(mode, (width, height), data[20:])
+
+
+class ArtifactCache:
+    """Size-bounded LRU cache of files under root (disabled when root is None)."""
+
+    def __init__(
+        self,
+        root: Optional[Path],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        volume=None,
+    ):
+        self.root = Path(root) if root else None
+        self.max_bytes = max_bytes
+        self.volume = volume
+        self._lock = threading.Lock()
+        self._size = 0
+        # "kind/key" -> [size, last used]; loaded on first use
+        self._index: Optional[Dict[str, List[float]]] = None
+        self._removed: Set[str] = set()
+        self._dirty = False
+        self._object_keys: dict = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.root / kind / key[:2] / key
+
+    # -- size / LRU index ------------------------------------------------------
+
+    def _load_index(self) -> Dict[str, List[float]]:
+        """The index, read (or rebuilt by one scan) on first use; call under the lock."""
+        if self._index is None:
+            try:
+                self._index = json.loads((self.root / _INDEX_NAME).read_text())
+            except (OSError, ValueError):
+                self._index = self._scan()
+                self._dirty = True
+            self._size = int(sum(entry[0] for entry in self._index.values()))
+        return self._index
+
+    def _scan(self) -> Dict[str, List[float]]:
+        index = {}
+        if self.root.is_dir():
+            for f in self.root.rglob("*"):
+                if f.is_file() and not f.name.startswith(".") and f.name != _INDEX_NAME:
+                    st = f.stat()
+                    index[f"{f.relative_to(self.root).parts[0]}/{f.name}"] = [st.st_size, st.st_mtime]
+        return index
+
+    def _save_index(self) -> None:
+        """Merge the index into the one on disk and write it; call under the lock."""
+        path = self.root / _INDEX_NAME
+        try:
+            on_disk = json.loads(path.read_text())
+        except (OSError, ValueError):
+            on_disk = {}
+        # Entries other containers added (or touched later) are kept; stale
+        # ones are dropped by lookup() when their file turns out to be gone
+        for name, entry in on_disk.items():
+            mine = self._index.get(name)
+            if name not in self._removed and (mine is None or entry[1] > mine[1]):
+                self._index[name] = entry
+        self._removed.clear()
+        self._size = int(sum(entry[0] for entry in self._index.values()))
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{_INDEX_NAME}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self._index))
+        tmp.replace(path)
+
+    # -- raw files ---------------------------------------------------------
+
+    def get(self, kind: str, key: str) -> Optional[bytes]:
+        path = self.lookup(kind, key)
+        if path is None:
+            return None
+        data = path.read_bytes()
+        with self._lock:
+            self.bytes_read += len(data)
+        return data
+
+    def lookup(self, kind: str, key: str) -> Optional[Path]:
+        """Path of a cached entry (touched for LRU), or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(kind, key)
+        name = f"{kind}/{key}"
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                index = self._load_index()
+                if name in index:
+                    self._size -= index.pop(name)[0]
+                    self._dirty = True
+            return None
+        with self._lock:
+            self.hits += 1
+            index = self._load_index()
+            if name in index:
+                index[name][1] = time.time()
+            else:
+                index[name] = [path.stat().st_size, time.time()]
+                self._size += index[name][0]
+            self._dirty = True
+        return path
+
+    def contains(self, kind: str, key: Optional[str]) -> bool:
+        """Whether an entry exists (not counted as a hit or miss, not touched)."""
+        return self.enabled and key is not None and self._path(kind, key).exists()
+
+    def put(self, kind: str, key: str, data: bytes) -> None:
+        if not self.enabled:
+            return
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        self._added(kind, key, len(data))
+
+    def put_file(self, kind: str, key: str, src: Path) -> None:
+        if not self.enabled:
+            return
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src, tmp)
+        tmp.replace(path)
+        self._added(kind, key, path.stat().st_size)
+
+    def _added(self, kind: str, key: str, nbytes: int) -> None:
+        with self._lock:
+            self.bytes_written += nbytes
+            self._dirty = True
+            index = self._load_index()
+            name = f"{kind}/{key}"
+            self._size += nbytes - (index[name][0] if name in index else 0)
+            index[name] = [nbytes, time.time()]
+            self._removed.discard(name)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Least recently used first, straight from the index
+        for name, (nbytes, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._size <= self.max_bytes * _EVICT_TARGET:
+                break
+            kind, key = name.split("/", 1)
+            self._path(kind, key).unlink(missing_ok=True)
+            del self._index[name]
+            self._removed.add(name)
+            self._size -= nbytes
+            self.evictions += 1
+
+    # -- storage objects -----------------------------------------------------
+
+    def object_key(self, storage, bucket: str, path: str) -> Optional[str]:
+        """Cache key of a storage object from its ETag (None if unavailable)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if (bucket, path) in self._object_keys:
+                return self._object_keys[(bucket, path)]
+        etag = storage.etag(bucket, path)
+        key = content_key(bucket, path, etag) if etag else None
+        with self._lock:
+            self._object_keys[(bucket, path)] = key
+        return key
+
+    def fetch(self, storage, bucket: str, path: str) -> bytes:
+        """Download an object through the cache (keyed by its ETag)."""
+        key = self.object_key(storage, bucket, path)
+        if key is None:
+            return storage.download(bucket, path)
+        data = self.get("raw", key)
+        if data is None:
+            data = storage.download(bucket, path)
+            self.put("raw", key, data)
+        return data
+
+    def fetch_to(self, storage, bucket: str, path: str, dest: Path) -> Path:
+        """Download an object into dest through the cache."""
+        key = self.object_key(storage, bucket, path)
+        if key is None:
+            return storage.download_to(bucket, path, dest)
+        cached = self.lookup("raw", key)
+        if cached is not None:
+            shutil.copyfile(cached, dest)
+            with self._lock:
+                self.bytes_read += Path(dest).stat().st_size
+            return Path(dest)
+        storage.download_to(bucket, path, dest)
+        self.put_file("raw", key, Path(dest))
+        return Path(dest)
+
+    # -- derived artifacts -----------------------------------------------------
+
+    def memo_image(
+        self,
+        kind: str,
+        key: Optional[str],
+        compute: Callable[[], Image.Image],
+    ) -> Image.Image:
+        """Cached image artifact (stored as raw pixels, no re-encode loss).
+
+        A None key computes without caching, as does memo_json.
+        """
+        if key is None:
+            return compute()
+        data = self.get(kind, key)
+        if data is not None:
+            img = _decode_image(data)
+            if img is not None:
+                return img
+        img = compute()
+        self.put(kind, key, _encode_image(img))
+        return img
+
+    def memo_bytes(self, kind: str, key: Optional[str], compute: Callable[[], bytes]) -> bytes:
+        """Cached bytes artifact (e.g. an encoded variant)."""
+        if key is None:
+            return compute()
+        data = self.get(kind, key)
+        if data is None:
+            data = compute()
+            self.put(kind, key, data)
+        return data
+
+    def memo_file(
+        self,
+        kind: str,
+        key: Optional[str],
+        dest: Path,
+        compute: Callable[[Path], None],
+        extras: Sequence[Path] = (),
+    ) -> bool:
+        """Materialize a cached file at dest, or compute(dest) and cache it.
+
+        `extras` are further files compute() writes alongside dest (e.g. a
+        poster and preview of an encoded variant); they are cached and
+        restored with it, and a hit requires all of them. Returns True on
+        a cache hit.
+        """
+        entries = [(Path(dest), key)] + [
+            (Path(extra), content_key(key, i)) for i, extra in enumerate(extras, 1)
+        ] if key is not None else []
+        cached = []
+        for _, entry_key in entries:
+            path = self.lookup(kind, entry_key)
+            if path is None:
+                break
+            cached.append(path)
+        if entries and len(cached) == len(entries):
+            for src, (path, _) in zip(cached, entries):
+                shutil.copyfile(src, path)
+                with self._lock:
+                    self.bytes_read += path.stat().st_size
+            return True
+        compute(Path(dest))
+        for path, entry_key in entries:
+            if path.exists():
+                self.put_file(kind, entry_key, path)
+        return False
+
+    def memo_json(self, kind: str, key: Optional[str], compute: Callable[[], Any]) -> Any:
+        """Cached JSON-serializable artifact."""
+        if key is None:
+            return compute()
+        data = self.get(kind, key)
+        if data is not None:
+            try:
+                return json.loads(data)
+            except ValueError:
+                pass
+        value = compute()
+        self.put(kind, key, json.dumps(value).encode())
+        return value
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def commit(self) -> None:
+        """Persist the index and new entries (to the backing volume, if any)."""
+        if not self.enabled or not self._dirty:
+            return
+        with self._lock:
+            try:
+                self._save_index()
+            except OSError as e:
+                print(f"Warning: Failed to write artifact cache index: {e}")
+        if self.volume is not None:
+            try:
+                self.volume.commit()
+            except Exception as e:
+                print(f"Warning: Failed to commit artifact cache: {e}")
+                return
+        self._dirty = False
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "disabled"
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return (
+            f"{self.hits} hits, {self.misses} misses ({rate} hit rate), "
+            f"{self.bytes_read / 1e6:.1f} MB served, {self.bytes_written / 1e6:.1f} MB stored, "
+            f"{self.evictions} evicted"
+        )
+
+
+def open_artifact_cache(volume=None, mount_path: str = "/cache") -> ArtifactCache:
+    """Cache under ARTIFACT_CACHE_DIR when set, else the mounted volume.
+
+    Falls back to a disabled (pass-through) cache when neither exists.
+    """
+    max_bytes = int(os.environ.get("ARTIFACT_CACHE_BYTES", DEFAULT_MAX_BYTES))
+    local_dir = os.environ.get("ARTIFACT_CACHE_DIR")
+    if local_dir:
+        return ArtifactCache(Path(local_dir), max_bytes)
+    if volume is not None and Path(mount_path).is_dir():
+        try:
+            volume.reload()
+        except Exception as e:
+            print(f"Warning: Failed to reload artifact cache volume: {e}")
+        return ArtifactCache(Path(mount_path), max_bytes, volume=volume)
+    return ArtifactCache(None)
@@ -0,0 +1,129 @@
+"""
+Segment checkpoints for long-running jobs.
+
+Video faceswap encodes its output in fixed-size segments. Each finished
+segment is persisted together with a JSON manifest, so a retried job can
+pick up after the last completed segment instead of starting from frame 0.
+
+Two stores share the same small interface:
+- StorageCheckpointStore: objects under a prefix in a StorageBackend bucket
+- LocalCheckpointStore: plain files in a directory (local runs / tests)
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MANIFEST_NAME = "manifest.json"
+ATTEMPTS_NAME = "attempts.json"
+MANIFEST_VERSION = 1
+
+
+class StorageCheckpointStore:
+    """Checkpoint objects stored under `prefix` in a storage bucket."""
+
+    def __init__(self, storage, bucket: str, prefix: str):
+        self.storage = storage
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self._written: List[str] = []
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}/{name}"
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            return self.storage.download(self.bucket, self._key(name))
+        except Exception:
+            return None
+
+    def write(self, name: str, data: bytes, content_type: str) -> None:
+        self.storage.upload(self.bucket, self._key(name), data, content_type, upsert=True)
+        self._written.append(self._key(name))
+
+    def clear(self, names: List[str]) -> None:
+        keys = sorted({self._key(n) for n in names} | set(self._written))
+        if keys:
+            self.storage.remove(self.bucket, keys)
+
+
+class LocalCheckpointStore:
+    """Checkpoint files stored in a local directory."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def read(self, name: str) -> Optional[bytes]:
+        path = self.root / name
+        return path.read_bytes() if path.exists() else None
+
+    def write(self, name: str, data: bytes, content_type: str) -> None:
+        tmp = self.root / f".{name}.tmp"
+        tmp.write_bytes(data)
+        tmp.replace(self.root / name)
+
+    def clear(self, names: List[str]) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def new_manifest(**identity: Any) -> Dict[str, Any]:
+    """Create an empty manifest tagged with the job inputs it belongs to."""
+    return {"version": MANIFEST_VERSION, **identity, "segments": []}
+
+
+def load_manifest(store, **identity: Any) -> Dict[str, Any]:
+    """
+    Load the manifest from store if it matches the given job inputs.
+
+    A manifest written for different inputs (other source, face, frame count
+    or segment size) is discarded so stale segments are never reused.
+    """
+    raw = store.read(MANIFEST_NAME)
+    if raw:
+        try:
+            manifest = json.loads(raw)
+        except (ValueError, TypeError):
+            manifest = None
+        if (
+            manifest
+            and manifest.get("version") == MANIFEST_VERSION
+            and all(manifest.get(k) == v for k, v in identity.items())
+        ):
+            return manifest
+    return new_manifest(**identity)
+
+
+def save_segment(
+    store,
+    manifest: Dict[str, Any],
+    segment: Dict[str, Any],
+    segment_path: Path,
+) -> None:
+    """Persist a finished segment, then the manifest that references it."""
+    store.write(segment["name"], segment_path.read_bytes(), "video/mp4")
+    manifest["segments"].append(segment)
+    store.write(MANIFEST_NAME, json.dumps(manifest).encode(), "application/json")
+
+
+def start_attempt(store) -> int:
+    """Count one more attempt at the job and return its number (1-based).
+
+    Kept next to the checkpoints, so it survives the container being killed
+    (timeout, preemption) and lets the last attempt know it is the last.
+    """
+    count = 0
+    raw = store.read(ATTEMPTS_NAME)
+    if raw:
+        try:
+            count = int(json.loads(raw)["count"])
+        except (ValueError, TypeError, KeyError):
+            count = 0
+    store.write(ATTEMPTS_NAME, json.dumps({"count": count + 1}).encode(), "application/json")
+    return count + 1
+
+
+def segment_names(manifest: Dict[str, Any]) -> List[str]:
+    """All object names written for this manifest (segments, manifest, attempts)."""
+    return [s["name"] for s in manifest.get("segments", [])] + [MANIFEST_NAME, ATTEMPTS_NAME]
@@ -0,0 +1,99 @@
+"""
+Per-variant color transforms shared by the video and image pipelines.
+
+A variant's color jitter is described once, as ColorParams:
+- gain: multiplies the whole pixel (image brightness)
+- offset: added to luma, as a fraction of full scale (FFmpeg eq brightness)
+- saturation: scales chroma (FFmpeg eq saturation / blend against luma)
+- hue: rotates chroma in the Cb/Cr plane, in degrees (FFmpeg hue h)
+- tint: per-channel RGB offsets in 0-255 units
+
+Before clipping the transform is affine in RGB, so it compiles to a 3x4
+matrix. Images apply that matrix in one uint8 pass (Image.convert). Video
+frames are YUV, where the video transform (no gain or tint) is a luma
+offset plus a scaled rotation of (Cb, Cr): FFmpeg's hue filter applies
+exactly that through 8-bit lookup tables, with no RGB round trip (see
+hue_args).
+"""
+
+import math
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+# ITU-R 601-2 luma weights, as used by Image.convert("L") and FFmpeg's eq/hue
+_LUMA = np.array([0.299, 0.587, 0.114])
+
+# RGB -> (Y, Cb, Cr) without offsets, and its inverse
+_TO_YCC = np.array([
+    _LUMA,
+    (np.array([0.0, 0.0, 1.0]) - _LUMA) / (2 * (1 - _LUMA[2])),
+    (np.array([1.0, 0.0, 0.0]) - _LUMA) / (2 * (1 - _LUMA[0])),
+])
+_FROM_YCC = np.linalg.inv(_TO_YCC)
+
+
+class ColorParams(NamedTuple):
+    gain: float = 1.0
+    offset: float = 0.0
+    saturation: float = 1.0
+    hue: float = 0.0
+    tint: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+
+
+def video_params(transformations: Dict[str, float]) -> ColorParams:
+    """ColorParams of a video variant (eq brightness/saturation + hue)."""
+    return ColorParams(
+        offset=transformations["brightness"],
+        saturation=transformations["saturation"],
+        hue=transformations["hue"],
+    )
+
+
+def image_params(params: Dict[str, object]) -> ColorParams:
+    """ColorParams of an image augmentation (brightness factor, saturation, tint)."""
+    return ColorParams(
+        gain=params["brightness"],
+        saturation=params["saturation"],
+        tint=tuple(float(t) for t in params["tint"]),
+    )
+
+
+def hue_args(params: ColorParams) -> Tuple[float, float, float]:
+    """(degrees, saturation, brightness) for FFmpeg's hue filter.
+
+    Brightness is in hue's units (luma + b * 25.5). Only transforms without
+    gain or tint (as made by video_params) are expressible.
+    """
+    if params.gain != 1.0 or any(params.tint):
+        raise ValueError("hue cannot apply gain or tint")
+    return params.hue, params.saturation, params.offset * 10.0
+
+
+def color_matrix(params: ColorParams) -> np.ndarray:
+    """3x4 affine RGB matrix (0-255 units) of the transform, before clipping.
+
+        out = gain * (Y + saturation * R(hue) * chroma) + offset * 255 + tint
+    """
+    theta = math.radians(params.hue)
+    cos, sin = math.cos(theta), math.sin(theta)
+    chroma = params.saturation * np.array([[cos, -sin], [sin, cos]])
+
+    ycc = np.eye(3)
+    ycc[1:, 1:] = chroma
+    linear = params.gain * (_FROM_YCC @ ycc @ _TO_YCC)
+    constant = params.offset * 255.0 + np.asarray(params.tint, dtype=np.float64)
+    return np.hstack([linear, constant[:, None]])
+
+
+def matrix_tuple(params: ColorParams) -> Tuple[float, ...]:
+    """color_matrix() flattened for Image.convert(matrix=...)."""
+    return tuple(float(v) for v in color_matrix(params).ravel())
+
+
+def apply_image(img: Image.Image, params: ColorParams) -> Image.Image:
+    """Apply the transform to an image in one fused uint8 pass."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img.convert("RGB", matrix=matrix_tuple(params))
@@ -6,9 +6,12 @@ swaps it with the reference face, and enhances with GFPGAN.
 """
 
 import os
+import math
+import subprocess
 import numpy as np
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 
 # Model paths (baked into Modal container image)
@@ -17,8 +20,29 @@ INSIGHTFACE_DIR = "/root/.insightface"
 SWAP_MODEL_PATH = os.path.join(MODELS_DIR, "inswapper_128.onnx")
 GFPGAN_MODEL_PATH = os.path.join(MODELS_DIR, "GFPGANv1.4.pth")
 
+# Resolution-adaptive detection. Frames are downscaled so the expected face
+# lands at roughly DET_TARGET_FACE_PX in the detector input, bounded by
+# DET_MIN_SIDE..DET_MAX_SIDE on the long side (SCRFD needs multiples of 32).
+DET_TARGET_FACE_PX = 64
+DET_MIN_SIDE = 256
+DET_MAX_SIDE = 640
+DEFAULT_FACE_FRAC = 0.2  # expected face width as a fraction of the short side
+DET_THRESHOLD = 0.5
 
-def _get_face_analyser():
+# Faces whose short side (in full-resolution pixels) falls below this get a
+# second detection pass on a full-resolution ROI for tighter landmarks.
+REFINE_FACE_PX = 96
+REFINE_MARGIN = 0.75  # ROI padding as a fraction of the bbox size
+
+# Face-presence pre-scan for video: every PRESCAN_STRIDE-th frame is decoded at
+# PRESCAN_LONG_SIDE and run through the detector. Presence is dilated by
+# PRESCAN_PAD_FRAMES so faces entering between samples are never missed.
+PRESCAN_LONG_SIDE = 320
+PRESCAN_STRIDE = 3
+PRESCAN_PAD_FRAMES = 4
+
+
+def _get_face_analyser(det_size: Tuple[int, int] = (640, 640)):
     """Initialize InsightFace analyser (cached after first call)."""
     import insightface
 
@@ -27,7 +51,7 @@ def _get_face_analyser():
         root=INSIGHTFACE_DIR,
         providers=["CPUExecutionProvider"],
     )
-    analyser.prepare(ctx_id=0, det_size=(640, 640))
+    analyser.prepare(ctx_id=0, det_size=det_size, det_thresh=DET_THRESHOLD)
     return analyser
 
 
@@ -61,22 +85,229 @@ def get_largest_face(faces):
     return max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
 
 
+def _round32(value: float) -> int:
+    """Round up to the next multiple of 32 (SCRFD stride requirement)."""
+    return max(32, int(math.ceil(value / 32.0)) * 32)
+
+
+def choose_det_size(
+    width: int,
+    height: int,
+    expected_face_frac: float = DEFAULT_FACE_FRAC,
+) -> Tuple[int, int]:
+    """
+    Pick a detector input size (w, h) for a frame of the given resolution.
+
+    Large faces survive heavy downscaling, so the input is shrunk until the
+    expected face is about DET_TARGET_FACE_PX wide. The aspect ratio follows
+    the frame, so portrait video does not waste half the input on padding.
+    """
+    expected_face_px = max(expected_face_frac * min(width, height), 1.0)
+    scale = min(1.0, DET_TARGET_FACE_PX / expected_face_px)
+    long_side = max(width, height) * scale
+    long_side = min(max(long_side, DET_MIN_SIDE), DET_MAX_SIDE, max(width, height))
+    scale = long_side / max(width, height)
+    return _round32(width * scale), _round32(height * scale)
+
+
+def _detect_raw(det_model, img: np.ndarray, det_size: Tuple[int, int]):
+    """Run SCRFD on img, returning (bboxes, kpss) in img coordinates."""
+    bboxes, kpss = det_model.detect(img, input_size=det_size, max_num=0, metric="default")
+    if bboxes is None or bboxes.shape[0] == 0:
+        return np.zeros((0, 5), dtype=np.float32), None
+    return bboxes, kpss
+
+
+def _refine_face(det_model, img: np.ndarray, bbox: np.ndarray):
+    """Re-detect a small face on a full-resolution crop around its bbox."""
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = bbox[:4]
+    pad_x = (x2 - x1) * REFINE_MARGIN
+    pad_y = (y2 - y1) * REFINE_MARGIN
+    rx1, ry1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+    rx2, ry2 = min(w, int(math.ceil(x2 + pad_x))), min(h, int(math.ceil(y2 + pad_y)))
+    if rx2 - rx1 < 16 or ry2 - ry1 < 16:
+        return None
+
+    roi = img[ry1:ry2, rx1:rx2]
+    roi_size = choose_det_size(roi.shape[1], roi.shape[0], expected_face_frac=0.5)
+    bboxes, kpss = _detect_raw(det_model, roi, roi_size)
+    if bboxes.shape[0] == 0:
+        return None
+
+    best = int(np.argmax((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])))
+    offset = np.array([rx1, ry1], dtype=np.float32)
+    refined_bbox = bboxes[best].copy()
+    refined_bbox[:4] += np.tile(offset, 2)
+    refined_kps = kpss[best] + offset if kpss is not None else None
+    return refined_bbox, refined_kps
+
+
+def detect_faces(
+    img: np.ndarray,
+    analyser,
+    expected_face_frac: float = DEFAULT_FACE_FRAC,
+    refine: bool = True,
+) -> List:
+    """
+    Detect faces on a downscaled copy of img, mapped back to full resolution.
+
+    Only the SCRFD detector runs: the swapper needs bbox + 5-point landmarks
+    for the target face, so the landmark/attribute/recognition models that
+    `analyser.get` would also run are skipped.
+
+    Args:
+        img: Full-resolution BGR frame
+        analyser: Prepared InsightFace analyser (its det_model is used)
+        expected_face_frac: Expected face width relative to the short side
+        refine: Re-detect small faces on a full-resolution ROI
+
+    Returns:
+        List of insightface Face objects in full-resolution coordinates
+    """
+    import cv2
+    from insightface.app.common import Face
+
+    det_model = analyser.det_model
+    h, w = img.shape[:2]
+    det_size = choose_det_size(w, h, expected_face_frac)
+
+    # Downscale to the content area of the detector input ourselves (area
+    # interpolation avoids the aliasing of SCRFD's internal linear resize).
+    scale = min(det_size[0] / w, det_size[1] / h, 1.0)
+    if scale < 1.0:
+        small = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img
+    sx = w / small.shape[1]
+    sy = h / small.shape[0]
+
+    bboxes, kpss = _detect_raw(det_model, small, det_size)
+
+    faces = []
+    for i in range(bboxes.shape[0]):
+        bbox = bboxes[i].copy()
+        bbox[:4] *= np.array([sx, sy, sx, sy], dtype=np.float32)
+        kps = kpss[i] * np.array([sx, sy], dtype=np.float32) if kpss is not None else None
+
+        if refine and min(bbox[2] - bbox[0], bbox[3] - bbox[1]) < REFINE_FACE_PX:
+            refined = _refine_face(det_model, img, bbox)
+            if refined is not None:
+                bbox, kps = refined
+
+        faces.append(Face(bbox=bbox[:4], kps=kps, det_score=float(bbox[4])))
+
+    return faces
+
+
+def scan_face_presence(
+    video_path: str,
+    analyser,
+    width: int,
+    height: int,
+    stride: int = PRESCAN_STRIDE,
+    pad_frames: int = PRESCAN_PAD_FRAMES,
+) -> List[bool]:
+    """
+    Build a per-frame face-presence timeline with a low-resolution pre-scan.
+
+    Frames are decoded once by FFmpeg straight to a small raw BGR stream, so
+    the scan never touches full-resolution pixels. Frame indices match those
+    produced by extracting the same video to an image sequence.
+
+    Args:
+        video_path: Source video path
+        analyser: Prepared InsightFace analyser (its det_model is used)
+        width: Source frame width
+        height: Source frame height
+        stride: Run the detector on every stride-th frame
+        pad_frames: Extra frames marked present around each detection
+
+    Returns:
+        List with one bool per decoded frame (True = face may be present)
+    """
+    scale = min(1.0, PRESCAN_LONG_SIDE / max(width, height))
+    scan_w = max(2, int(round(width * scale / 2)) * 2)
+    scan_h = max(2, int(round(height * scale / 2)) * 2)
+    det_size = (_round32(scan_w), _round32(scan_h))
+    frame_bytes = scan_w * scan_h * 3
+
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", video_path,
+        "-vf", f"scale={scan_w}:{scan_h}:flags=area",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    sampled: List[int] = []
+    hits: List[bool] = []
+    index = 0
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            if index % stride == 0:
+                frame = np.frombuffer(buf, dtype=np.uint8).reshape(scan_h, scan_w, 3)
+                bboxes, _ = _detect_raw(analyser.det_model, frame, det_size)
+                sampled.append(index)
+                hits.append(bboxes.shape[0] > 0)
+            index += 1
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+    total = index
+    presence = np.zeros(total, dtype=bool)
+    # A sample covers the frames up to its neighbouring samples, plus padding
+    reach = stride + pad_frames
+    for frame_idx, hit in zip(sampled, hits):
+        if hit:
+            presence[max(0, frame_idx - reach):min(total, frame_idx + reach + 1)] = True
+
+    return presence.tolist()
+
+
+def get_reference_face(reference_img: np.ndarray, analyser=None):
+    """
+    Analyse the reference image once and return its most prominent face.
+
+    The returned Face carries the identity embedding the swapper needs, so
+    callers processing many frames/images can reuse it instead of running
+    the full analyser on the reference for every swap.
+    """
+    if analyser is None:
+        analyser = _get_face_analyser()
+
+    ref_faces = analyser.get(reference_img)
+    if not ref_faces:
+        raise ValueError("No face detected in reference image")
+
+    return get_largest_face(ref_faces)
+
+
 def swap_face_in_image(
     source_img: np.ndarray,
-    reference_img: np.ndarray,
+    reference_img: Optional[np.ndarray],
     analyser=None,
     swapper=None,
     enhancer=None,
+    ref_face=None,
+    enhancer_lock=None,
 ) -> Optional[np.ndarray]:
     """
     Swap the most prominent face in source_img with the face from reference_img.
 
     Args:
         source_img: BGR numpy array (OpenCV format)
-        reference_img: BGR numpy array of reference face
+        reference_img: BGR numpy array of reference face (unused if ref_face given)
         analyser: Reusable InsightFace analyser instance
         swapper: Reusable inswapper model instance
         enhancer: Reusable GFPGAN enhancer instance
+        ref_face: Precomputed reference face from get_reference_face
+        enhancer_lock: Lock serialising GFPGAN when called from several threads
+            (its face helper keeps per-call state)
 
     Returns:
         BGR numpy array with swapped face, or None if no face detected
@@ -88,30 +319,28 @@ def swap_face_in_image(
     if enhancer is None:
         enhancer = _get_enhancer()
 
-    # Detect faces in source
-    source_faces = analyser.get(source_img)
+    # Detect faces in source (downscaled detection, full-resolution landmarks)
+    source_faces = detect_faces(source_img, analyser)
     if not source_faces:
         return None
 
     target_face = get_largest_face(source_faces)
 
     # Get reference face embedding
-    ref_faces = analyser.get(reference_img)
-    if not ref_faces:
-        raise ValueError("No face detected in reference image")
-
-    ref_face = get_largest_face(ref_faces)
+    if ref_face is None:
+        ref_face = get_reference_face(reference_img, analyser)
 
     # Perform the swap
     result = swapper.get(source_img, target_face, ref_face, paste_back=True)
 
     # Enhance the swapped face with GFPGAN
-    _, _, enhanced = enhancer.enhance(
-        result,
-        has_aligned=False,
-        only_center_face=False,
-        paste_back=True,
-    )
+    with enhancer_lock if enhancer_lock is not None else nullcontext():
+        _, _, enhanced = enhancer.enhance(
+            result,
+            has_aligned=False,
+            only_center_face=False,
+            paste_back=True,
+        )
 
     return enhanced if enhanced is not None else result
 
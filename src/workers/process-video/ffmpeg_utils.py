@@ -5,53 +5,553 @@ Advanced transformation functions including:
 - Watermark detection and removal
 - Batch processing optimization
 - Quality preservation techniques
+
+Video edits are expressed as FilterGraph stages, so combining several of
+them (delogo + noise + overlay + metadata strip, ...) costs one encode
+instead of one generation of loss per helper.
 """
 
 import subprocess
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import random
 
+import numpy as np
+
+# Concurrent single-frame seeks when sampling frames
+SEEK_WORKERS = 4
+
+# Watermark detection works on a sparse sample of frames decoded at this width
+WATERMARK_SAMPLES = 16
+WATERMARK_ANALYSIS_WIDTH = 320
+# Analysis cells (pixels at analysis width) and the score that makes one active
+WATERMARK_CELL = 8
+WATERMARK_CELL_SCORE = 0.2
+# Gradient magnitude counted as an edge, and temporal std (0-255) above
+# which a pixel is considered moving content
+WATERMARK_EDGE = 24.0
+WATERMARK_MAX_STD = 16.0
+# Regions covering more of the frame than this are static scenery, not overlays
+WATERMARK_MAX_AREA = 0.25
+# Floors a region must clear to be reported: mean cell score, and temporal
+# std (0-255) of the content around it (an overlay sits on moving content,
+# so a static shot yields nothing)
+WATERMARK_MIN_CONFIDENCE = 0.3
+WATERMARK_MIN_SURROUND_STD = 6.0
+# Overlays sit near a frame edge or corner: the box must come within this
+# fraction of the frame from an edge, and span at most WATERMARK_MAX_SPAN of
+# either dimension (letterbox and UI bars run edge to edge)
+WATERMARK_BORDER = 0.15
+WATERMARK_MAX_SPAN = 0.6
+
+
+def seek_gray_frames(
+    input_path: str,
+    timestamps: Iterable[float],
+    width: int,
+    height: int,
+    flags: str = "area",
+) -> np.ndarray:
+    """Grayscale frames at the given times, shaped (N, height, width).
+
+    Each frame is an input-side seek (-ss before -i, so only the GOP up to
+    that time is decoded) plus -frames:v 1, scaled in FFmpeg; the seeks run
+    concurrently. Frames that fail to decode are left out.
+    """
+    frame_size = width * height
+
+    def grab(t: float) -> Optional[bytes]:
+        cmd = [
+            "ffmpeg", "-v", "error", "-ss", f"{t:.3f}", "-i", str(input_path),
+            "-frames:v", "1", "-vf", f"scale={width}:{height}:flags={flags},format=gray",
+            "-f", "rawvideo", "-",
+        ]
+        out = subprocess.run(cmd, capture_output=True).stdout
+        return out[:frame_size] if len(out) >= frame_size else None
 
-def detect_watermark(input_path: str) -> Optional[Dict[str, int]]:
+    timestamps = list(timestamps)
+    with ThreadPoolExecutor(max_workers=min(SEEK_WORKERS, max(1, len(timestamps)))) as pool:
+        frames = [f for f in pool.map(grab, timestamps) if f is not None]
+    return np.frombuffer(b"".join(frames), dtype=np.uint8).reshape(len(frames), height, width)
+
+
+def _sample_gray_frames(
+    input_path: str,
+    width: int,
+    height: int,
+    samples: int,
+) -> Optional[np.ndarray]:
+    """Up to `samples` evenly spread grayscale frames, shaped (N, height, width)."""
+    duration = get_video_duration(input_path) or 0
+    if duration <= 0:
+        return None
+    frames = seek_gray_frames(
+        input_path, ((k + 0.5) * duration / samples for k in range(samples)), width, height
+    )
+    return frames if len(frames) >= 2 else None
+
+
+def _overlay_score(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-pixel overlay likelihood (0-1) and temporal std from grayscale frames.
+
+    An overlay keeps the same edges in every frame while the content around
+    it moves: score = edge persistence * (1 - temporal std / WATERMARK_MAX_STD).
+    """
+    f = frames.astype(np.float32)
+    grad = np.zeros_like(f)
+    grad[:, :, 1:] += np.abs(np.diff(f, axis=2))
+    grad[:, 1:, :] += np.abs(np.diff(f, axis=1))
+    persistence = (grad > WATERMARK_EDGE).mean(axis=0)
+    std = f.std(axis=0)
+    stillness = np.clip(1.0 - std / WATERMARK_MAX_STD, 0.0, 1.0)
+    return persistence * stillness, std
+
+
+def _cell_components(active: np.ndarray) -> List[List[Tuple[int, int]]]:
+    """4-connected components of a small boolean grid."""
+    seen = np.zeros_like(active)
+    components = []
+    for start in zip(*np.nonzero(active)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue, cells = deque([start]), []
+        while queue:
+            r, c = queue.popleft()
+            cells.append((r, c))
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if (0 <= nr < active.shape[0] and 0 <= nc < active.shape[1]
+                        and active[nr, nc] and not seen[nr, nc]):
+                    seen[nr, nc] = True
+                    queue.append((nr, nc))
+        components.append(cells)
+    return components
+
+
+def detect_watermarks(
+    input_path: str,
+    samples: int = WATERMARK_SAMPLES,
+    max_regions: int = 3,
+) -> List[Dict[str, float]]:
     """
-    Detect potential watermark regions in video.
+    Detect static overlay regions (watermarks, logos, burned-in handles).
 
-    Uses edge detection and logo detection heuristics to identify
-    common watermark positions (corners, etc.)
+    Decodes a sparse sample of frames at low resolution, scores every pixel
+    by edge persistence and temporal stillness, and groups high-scoring
+    cells into regions (filtered by find_overlay_regions()).
 
-    Returns coordinates of detected watermark region or None.
+    Returns up to max_regions boxes in source pixels, ranked by confidence:
+    [{"x", "y", "width", "height", "confidence"}, ...]. Empty if none found.
     """
-    # Get video dimensions
     info = get_video_dimensions(input_path)
     if not info:
-        return None
+        return []
+    src_w, src_h = info["width"], info["height"]
+    width = min(WATERMARK_ANALYSIS_WIDTH, src_w)
+    height = max(2, round(src_h * width / src_w / 2) * 2)
+
+    frames = _sample_gray_frames(input_path, width, height, samples)
+    if frames is None:
+        return []
+
+    return find_overlay_regions(frames, src_w, src_h, max_regions)
+
+
+def find_overlay_regions(
+    frames: np.ndarray,
+    src_w: int,
+    src_h: int,
+    max_regions: int = 3,
+) -> List[Dict[str, float]]:
+    """Overlay boxes (source pixels) in grayscale frames shaped (N, h, w).
+
+    Cells scoring above WATERMARK_CELL_SCORE are joined into regions; a
+    region is kept only if its mean score clears WATERMARK_MIN_CONFIDENCE,
+    the content around it moves, and it sits near a frame edge without
+    spanning the frame. See detect_watermarks() for the result format.
+    """
+    height, width = frames.shape[1:]
+    score, std = _overlay_score(frames)
+    rows, cols = height // WATERMARK_CELL, width // WATERMARK_CELL
+
+    def per_cell(values: np.ndarray) -> np.ndarray:
+        values = values[:rows * WATERMARK_CELL, :cols * WATERMARK_CELL]
+        return values.reshape(rows, WATERMARK_CELL, cols, WATERMARK_CELL).mean(axis=(1, 3))
+
+    cells, motion = per_cell(score), per_cell(std)
+
+    sx, sy = src_w / (cols * WATERMARK_CELL), src_h / (rows * WATERMARK_CELL)
+    regions = []
+    for component in _cell_components(cells >= WATERMARK_CELL_SCORE):
+        if len(component) < 2:
+            continue
+        rs, cs = zip(*component)
+        r0, r1, c0, c1 = min(rs), max(rs) + 1, min(cs), max(cs) + 1
+        if (r1 - r0) * (c1 - c0) > WATERMARK_MAX_AREA * rows * cols:
+            continue
+        if r1 - r0 > WATERMARK_MAX_SPAN * rows or c1 - c0 > WATERMARK_MAX_SPAN * cols:
+            continue
+        near_edge = (
+            min(c0, cols - c1) <= WATERMARK_BORDER * cols
+            or min(r0, rows - r1) <= WATERMARK_BORDER * rows
+        )
+        if not near_edge:
+            continue
+        confidence = float(np.mean([cells[rc] for rc in component]))
+        if confidence < WATERMARK_MIN_CONFIDENCE:
+            continue
+
+        # Content in a two-cell ring around the box must move
+        ring = np.zeros((rows, cols), dtype=bool)
+        ring[max(0, r0 - 2):r1 + 2, max(0, c0 - 2):c1 + 2] = True
+        ring[r0:r1, c0:c1] = False
+        if not ring.any() or float(motion[ring].mean()) < WATERMARK_MIN_SURROUND_STD:
+            continue
+
+        # Pad by one cell, scale to source pixels and keep the box strictly
+        # inside the frame (delogo rejects boxes touching the border)
+        x0 = max(1, int((c0 - 1) * WATERMARK_CELL * sx))
+        y0 = max(1, int((r0 - 1) * WATERMARK_CELL * sy))
+        x1 = min(src_w - 2, int((c1 + 1) * WATERMARK_CELL * sx))
+        y1 = min(src_h - 2, int((r1 + 1) * WATERMARK_CELL * sy))
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            continue
+        regions.append({
+            "x": x0,
+            "y": y0,
+            "width": x1 - x0,
+            "height": y1 - y0,
+            "confidence": round(min(1.0, confidence), 3),
+        })
+
+    regions.sort(key=lambda r: r["confidence"], reverse=True)
+    return regions[:max_regions]
+
+
+def detect_watermark(input_path: str) -> Optional[Dict[str, int]]:
+    """
+    Detect the most likely watermark region in video.
+
+    Returns the top-ranked box from detect_watermarks() or None.
+    """
+    regions = detect_watermarks(input_path, max_regions=1)
+    return regions[0] if regions else None
 
-    width, height = info["width"], info["height"]
 
-    # Common watermark positions (as percentages)
-    common_positions = [
-        # (x_start, y_start, width, height) as percentage of frame
-        (0.8, 0.9, 0.2, 0.1),   # bottom-right
-        (0.0, 0.9, 0.2, 0.1),   # bottom-left
-        (0.8, 0.0, 0.2, 0.1),   # top-right
-        (0.0, 0.0, 0.2, 0.1),   # top-left
-        (0.4, 0.45, 0.2, 0.1),  # center
+def delogo_filters(regions: List[Dict[str, int]]) -> List[str]:
+    """delogo filter per detected region."""
+    return [
+        f"delogo=x={r['x']}:y={r['y']}:w={r['width']}:h={r['height']}:show=0"
+        for r in regions
     ]
 
-    # For now, return a heuristic-based detection
-    # In production, this would use ML-based watermark detection
-    # or the Replicate API for more accurate detection
 
-    # Check bottom-right corner (most common watermark position)
-    return {
-        "x": int(width * 0.8),
-        "y": int(height * 0.9),
-        "width": int(width * 0.18),
-        "height": int(height * 0.08),
-    }
+OVERLAY_POSITIONS = {
+    "top-left": "10:10",
+    "top-right": "main_w-overlay_w-10:10",
+    "bottom-left": "10:main_h-overlay_h-10",
+    "bottom-right": "main_w-overlay_w-10:main_h-overlay_h-10",
+    "center": "(main_w-overlay_w)/2:(main_h-overlay_h)/2",
+}
+
+METADATA_STRIP_ARGS = [
+    "-map_metadata", "-1",
+    "-fflags", "+bitexact",
+    "-flags:v", "+bitexact",
+    "-flags:a", "+bitexact",
+]
+
+
+class FilterGraph:
+    """
+    Builder for a single FFmpeg invocation over one input video.
+
+    Stages are appended in call order and return self, so any combination
+    of operations runs as one decode and at most one encode:
+
+        FilterGraph(src).delogo(regions).eq(0.01, 1.02).crop_edges(2) \
+            .atempo(1.01).strip_metadata().run(out)
+
+    A stream with no filters is stream-copied, so metadata stripping alone
+    never re-encodes. Overlays switch the video chain to -filter_complex.
+    """
+
+    def __init__(self, input_path: str):
+        self.input_path = input_path
+        self.video_filters: List[str] = []
+        self.audio_filters: List[str] = []
+        self._overlay: Optional[Tuple[str, str]] = None
+        self._audio_track: Optional[str] = None
+        # (filters, output args, with audio, path) per extra output
+        self._extras: List[Tuple[str, List[str], bool, str]] = []
+        self._strip_metadata = False
+        self._crf = 23
+        self._preset = "fast"
+        self._audio_bitrate = "128k"
+
+    # -- video stages ------------------------------------------------------
+
+    def delogo(self, regions: List[Dict[str, int]]) -> "FilterGraph":
+        """Blur out each region (x, y, width, height in input pixels)."""
+        self.video_filters.extend(delogo_filters(regions))
+        return self
+
+    def eq(self, brightness: float = 0.0, saturation: float = 1.0) -> "FilterGraph":
+        self.video_filters.append(f"eq=brightness={brightness}:saturation={saturation}")
+        return self
+
+    def hue(self, degrees: float, saturation: float = 1.0, brightness: float = 0.0) -> "FilterGraph":
+        """Rotate and scale chroma, offset luma (native YUV, table lookups)."""
+        self.video_filters.append(f"hue=h={degrees}:s={saturation}:b={brightness}")
+        return self
+
+    def pixel_format(self, pix_fmt: str = "yuv420p") -> "FilterGraph":
+        """Convert to pix_fmt (e.g. RGB or 4:4:4 inputs, so the encoder writes 4:2:0)."""
+        self.video_filters.append(f"format={pix_fmt}")
+        return self
+
+    def crop_edges(self, px: int) -> "FilterGraph":
+        """Remove px pixels from each side."""
+        self.video_filters.append(f"crop=iw-{px * 2}:ih-{px * 2}:{px}:{px}")
+        return self
+
+    def noise(self, strength: float, seed: int) -> "FilterGraph":
+        """Temporal luma noise (strength 0-100, recommended 1-10)."""
+        self.video_filters.append(f"noise=c0s={strength}:c0f=t:c0_seed={seed}")
+        return self
+
+    def overlay(
+        self,
+        image_path: str,
+        position: str = "bottom-right",
+        opacity: float = 0.8,
+        scale: float = 0.15,
+    ) -> "FilterGraph":
+        """Composite an image (scaled relative to its own width) after the video stages."""
+        overlay_pos = OVERLAY_POSITIONS.get(position, OVERLAY_POSITIONS["bottom-right"])
+        watermark = f"[1:v]scale=iw*{scale}:-1,format=rgba,colorchannelmixer=aa={opacity}[wm]"
+        self._overlay = (image_path, f"{watermark};[base][wm]overlay={overlay_pos}[vout]")
+        return self
+
+    # -- audio stages ------------------------------------------------------
+
+    def atempo(self, speed: float) -> "FilterGraph":
+        """Change audio tempo without changing pitch (0.5-2.0)."""
+        self.audio_filters.append(f"atempo={speed}")
+        return self
+
+    def audio_track(self, path: str) -> "FilterGraph":
+        """Mux a ready-made audio track (e.g. from TempoTracks) by stream copy.
+
+        Replaces the input's own audio; audio filters are ignored.
+        """
+        self._audio_track = path
+        return self
+
+    # -- output options ----------------------------------------------------
+
+    def strip_metadata(self) -> "FilterGraph":
+        self._strip_metadata = True
+        return self
+
+    def encode(self, crf: int = 23, preset: str = "fast", audio_bitrate: str = "128k") -> "FilterGraph":
+        self._crf = crf
+        self._preset = preset
+        self._audio_bitrate = audio_bitrate
+        return self
+
+    # -- extra outputs (same decoded frames) -------------------------------
+
+    def poster(self, path: str, frame: int = 30, width: int = 540) -> "FilterGraph":
+        """Also write frame number `frame` (after all video stages) as a JPEG.
+
+        trim drops frames instead of holding them and ends the branch right
+        after the poster frame, so the split never buffers for it; keep
+        frame early (about a second in) all the same.
+        """
+        self._extras.append((
+            f"trim=start_frame={frame}:end_frame={frame + 1},scale={width}:-2",
+            ["-frames:v", "1", "-q:v", "3"],
+            False,
+            path,
+        ))
+        return self
+
+    def web_preview(self, path: str, width: int = 540, crf: int = 30, maxrate: str = "800k") -> "FilterGraph":
+        """Also write a small, capped-bitrate MP4 with the index up front (faststart)."""
+        self._extras.append((
+            f"scale={width}:-2,format=yuv420p",
+            [
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf),
+                "-maxrate", maxrate, "-bufsize", maxrate,
+                "-movflags", "+faststart",
+            ],
+            True,
+            path,
+        ))
+        return self
+
+    @property
+    def reencodes_video(self) -> bool:
+        return bool(self.video_filters) or self._overlay is not None or bool(self._extras)
+
+    def command(self, output_path: str) -> List[str]:
+        # Inputs first: options before an -i would apply to that input
+        cmd = ["ffmpeg", "-y", "-i", self.input_path]
+        if self._overlay is not None:
+            cmd += ["-i", self._overlay[0]]
+        if self._audio_track is None:
+            audio_map = "0:a?"
+        elif self._audio_track == self.input_path:
+            audio_map = "0:a:0?"
+        else:
+            audio_map = f"{2 if self._overlay is not None else 1}:a:0?"
+            cmd += ["-i", self._audio_track]
+        encode_audio = bool(self.audio_filters) and self._audio_track is None
+
+        video_map = "0:v"
+        if self._overlay is not None or self._extras:
+            chain = ",".join(self.video_filters) or "null"
+            graph = [f"[0:v]{chain}[base]"]
+            video_map = "[base]"
+            if self._overlay is not None:
+                graph.append(self._overlay[1])
+                video_map = "[vout]"
+            if self._extras:
+                # Extra outputs branch off the final frames, so the
+                # decode and every video stage run once for all of them
+                labels = "".join(f"[x{i}]" for i in range(len(self._extras)))
+                graph.append(f"{video_map}split={len(self._extras) + 1}[vmain]{labels}")
+                graph += [f"[x{i}]{extra[0]}[e{i}]" for i, extra in enumerate(self._extras)]
+                video_map = "[vmain]"
+            cmd += ["-filter_complex", ";".join(graph)]
+        elif self.video_filters:
+            cmd += ["-vf", ",".join(self.video_filters)]
+
+        if video_map != "0:v" or self._audio_track is not None:
+            cmd += ["-map", video_map, "-map", audio_map]
+        cmd += self._output_args(encode_audio) + [output_path]
+
+        for i, (_, args, with_audio, path) in enumerate(self._extras):
+            cmd += ["-map", f"[e{i}]"]
+            if with_audio:
+                cmd += ["-map", audio_map]
+            cmd += args
+            if with_audio and encode_audio:
+                cmd += ["-af", ",".join(self.audio_filters), "-c:a", "aac", "-b:a", self._audio_bitrate]
+            elif with_audio:
+                cmd += ["-c:a", "copy"]
+            else:
+                cmd += ["-an"]
+            if self._strip_metadata:
+                cmd += METADATA_STRIP_ARGS
+            cmd += [path]
+
+        return cmd
+
+    def _output_args(self, encode_audio: bool) -> List[str]:
+        """Options of the main output."""
+        args = []
+        if encode_audio:
+            args += ["-af", ",".join(self.audio_filters)]
+        if self._strip_metadata:
+            args += METADATA_STRIP_ARGS
+        if self.reencodes_video:
+            args += ["-c:v", "libx264", "-preset", self._preset, "-crf", str(self._crf)]
+        else:
+            args += ["-c:v", "copy"]
+        if encode_audio:
+            args += ["-c:a", "aac", "-b:a", self._audio_bitrate]
+        else:
+            args += ["-c:a", "copy"]
+        return args
+
+    def run(self, output_path: str) -> subprocess.CompletedProcess:
+        """Run the graph; check returncode (stderr is captured as text)."""
+        return subprocess.run(self.command(output_path), capture_output=True, text=True)
+
+
+# Audio codecs the MP4 muxer accepts, so a track can be stream-copied
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac", "ac3", "eac3", "opus"}
+
+# Tempos this close to 1.0 are treated as unchanged (inaudible, < 0.2 s/min)
+TEMPO_EPSILON = 0.003
+
+
+def audio_codec(info: Dict) -> Optional[str]:
+    """Codec of the first audio stream in ffprobe -show_streams output, or None."""
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "audio":
+            return stream.get("codec_name") or "unknown"
+    return None
+
+
+class TempoTracks:
+    """
+    Audio tracks of one source at several tempos, ready to mux into variants.
+
+    prepare() decodes the source audio once and splits it into one atempo
+    branch per missing tempo, all encoded in the same FFmpeg pass. A tempo
+    within TEMPO_EPSILON of 1.0 uses the source track itself when its codec
+    can be stream-copied into MP4. Variants then mux their track with
+    -c:a copy instead of re-decoding and re-encoding audio per variant.
+    """
+
+    def __init__(self, source_path: str, codec: Optional[str], work_dir: Path, bitrate: str = "128k"):
+        self.source_path = str(source_path)
+        self.codec = codec
+        self.work_dir = Path(work_dir)
+        self.bitrate = bitrate
+        self._tracks: Dict[float, str] = {}
+
+    @staticmethod
+    def _key(speed: float) -> float:
+        return round(speed, 6)
+
+    def copies(self, speed: float) -> bool:
+        return self.codec in MP4_AUDIO_CODECS and abs(speed - 1.0) < TEMPO_EPSILON
+
+    def prepare(self, speeds: Iterable[float]) -> None:
+        """Encode every tempo in speeds not yet available, in one pass."""
+        if self.codec is None:
+            return
+        pending = sorted({
+            self._key(s) for s in speeds
+            if self._key(s) not in self._tracks and not self.copies(s)
+        })
+        if not pending:
+            return
+
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        n = len(pending)
+        graph = [f"[0:a:0]asplit={n}" + "".join(f"[s{i}]" for i in range(n))]
+        graph += [f"[s{i}]atempo={speed}[a{i}]" for i, speed in enumerate(pending)]
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", self.source_path, "-filter_complex", ";".join(graph)]
+        paths = []
+        for i, speed in enumerate(pending):
+            path = str(self.work_dir / f"tempo_{speed:.6f}.m4a")
+            cmd += ["-map", f"[a{i}]", "-c:a", "aac", "-b:a", self.bitrate,
+                    "-map_metadata", "-1", "-flags:a", "+bitexact", path]
+            paths.append(path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg audio tempo pass failed: {result.stderr}")
+        self._tracks.update(zip(pending, paths))
+
+    def track(self, speed: float) -> Optional[str]:
+        """Audio file for a tempo (prepared on demand), or None if there is no audio."""
+        if self.codec is None:
+            return None
+        if self.copies(speed):
+            return self.source_path
+        if self._key(speed) not in self._tracks:
+            self.prepare([speed])
+        return self._tracks[self._key(speed)]
 
 
 def get_video_dimensions(input_path: str) -> Optional[Dict[str, int]]:
@@ -100,24 +600,7 @@ def remove_watermark_inpaint(
     Returns:
         True if successful, False otherwise
     """
-    x = watermark_region["x"]
-    y = watermark_region["y"]
-    w = watermark_region["width"]
-    h = watermark_region["height"]
-
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i", input_path,
-        "-vf", f"delogo=x={x}:y={y}:w={w}:h={h}:show=0",
-        "-c:v", "libx264",
-        "-preset", "fast",
-        "-crf", "23",
-        "-c:a", "copy",
-        output_path,
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = FilterGraph(input_path).delogo([watermark_region]).run(output_path)
     return result.returncode == 0
 
 
@@ -143,69 +626,8 @@ def add_watermark(
     Returns:
         True if successful, False otherwise
     """
-    # Position mapping for FFmpeg overlay filter
-    position_map = {
-        "top-left": "10:10",
-        "top-right": "main_w-overlay_w-10:10",
-        "bottom-left": "10:main_h-overlay_h-10",
-        "bottom-right": "main_w-overlay_w-10:main_h-overlay_h-10",
-        "center": "(main_w-overlay_w)/2:(main_h-overlay_h)/2",
-    }
-
-    overlay_pos = position_map.get(position, position_map["bottom-right"])
-
-    # Build filter complex for watermark with opacity and scale
-    filter_complex = (
-        f"[1:v]scale=iw*{scale}:-1,format=rgba,colorchannelmixer=aa={opacity}[wm];"
-        f"[0:v][wm]overlay={overlay_pos}"
-    )
-
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i", input_path,
-        "-i", watermark_path,
-        "-filter_complex", filter_complex,
-        "-c:v", "libx264",
-        "-preset", "fast",
-        "-crf", "23",
-        "-c:a", "copy",
-        output_path,
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return result.returncode == 0
-
-
-def generate_thumbnail(
-    input_path: str,
-    output_path: str,
-    timestamp: float = 1.0,
-    width: int = 320,
-) -> bool:
-    """
-    Generate a thumbnail from video at specified timestamp.
-
-    Args:
-        input_path: Path to input video
-        output_path: Path for output thumbnail (jpg/png)
-        timestamp: Time in seconds to capture frame
-        width: Thumbnail width (height auto-calculated)
-
-    Returns:
-        True if successful, False otherwise
-    """
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-ss", str(timestamp),
-        "-i", input_path,
-        "-vframes", "1",
-        "-vf", f"scale={width}:-1",
-        output_path,
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    graph = FilterGraph(input_path).overlay(watermark_path, position, opacity, scale)
+    result = graph.run(output_path)
     return result.returncode == 0
 
 
@@ -287,19 +709,7 @@ def apply_noise_filter(
     if seed is None:
         seed = random.randint(0, 999999)
 
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i", input_path,
-        "-vf", f"noise=c0s={strength}:c0f=t:seed={seed}",
-        "-c:v", "libx264",
-        "-preset", "fast",
-        "-crf", "23",
-        "-c:a", "copy",
-        output_path,
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = FilterGraph(input_path).noise(strength, seed).run(output_path)
     return result.returncode == 0
 
 
@@ -328,20 +738,11 @@ def strip_metadata(input_path: str, output_path: str) -> bool:
     - Creation timestamps
     - GPS data
     - Any other embedded metadata
-    """
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i", input_path,
-        "-map_metadata", "-1",
-        "-fflags", "+bitexact",
-        "-flags:v", "+bitexact",
-        "-flags:a", "+bitexact",
-        "-c", "copy",
-        output_path,
-    ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    Streams are copied, not re-encoded. To strip metadata as part of other
+    edits, add strip_metadata() to their FilterGraph instead.
+    """
+    result = FilterGraph(input_path).strip_metadata().run(output_path)
     return result.returncode == 0
 
 
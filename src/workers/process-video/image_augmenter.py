@@ -8,71 +8,252 @@ Each variant gets imperceptible but pixel-unique modifications:
 - JPEG quality: randomized 85-95
 - Metadata: stripped (EXIF/ICC/XMP)
 
+Brightness, saturation and tint are fused into one 3x4 color matrix and
+applied in a single uint8 pass (Image.convert with a matrix). The matrix
+comes from color_lut, which also maps video variants' color jitter to FFmpeg.
+
 No geometric transforms (rotation, zoom, crop).
+
+uniquify_jpeg() is a lighter alternative for JPEG sources that only need to
+be made unique (no caption): the image is decoded once straight to YCbCr, each
+plane gets a constant offset (equivalent to shifting every block's DC
+coefficient), and it is re-encoded with the source's own quantization
+tables and chroma subsampling, so there is no RGB round trip and almost
+no requantization loss.
 """
 
+import io
 import random
+import sys
+import time
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import numpy as np
-from PIL import Image, ImageEnhance
+from PIL import Image, JpegImagePlugin
 
+from color_lut import image_params, matrix_tuple
 
-def _brightness_jitter(img: Image.Image) -> Image.Image:
-    """Adjust brightness by +/-5%."""
-    factor = 1.0 + random.choice([-1, 1]) * random.uniform(0.01, 0.05)
-    return ImageEnhance.Brightness(img).enhance(factor)
+# Highest-frequency quantization table entries (natural order) that
+# uniquify_jpeg may bump by one step; these barely affect perceived quality
+_HF_QUANT_INDICES = (63, 62, 55)
 
 
-def _saturation_jitter(img: Image.Image) -> Image.Image:
-    """Adjust color saturation by +/-5%."""
-    factor = 1.0 + random.choice([-1, 1]) * random.uniform(0.01, 0.05)
-    return ImageEnhance.Color(img).enhance(factor)
+def sample_augment_params(rng: Optional[random.Random] = None) -> Dict[str, object]:
+    """Draw one set of augmentation parameters.
+
+    - brightness: multiplicative factor, 1 +/- (1-5%)
+    - saturation: blend factor against luma, 1 +/- (1-5%)
+    - tint: per-channel RGB offset, +/- (1-3)
+    """
+    rng = rng or random
+    brightness = 1.0 + rng.choice([-1, 1]) * rng.uniform(0.01, 0.05)
+    saturation = 1.0 + rng.choice([-1, 1]) * rng.uniform(0.01, 0.05)
+    tint = tuple(rng.choice([-1, 1]) * rng.randint(1, 3) for _ in range(3))
+    return {"brightness": brightness, "saturation": saturation, "tint": tint}
 
 
-def _color_tint(img: Image.Image) -> Image.Image:
-    """Apply a subtle random RGB channel offset of +/-3 per channel using numpy."""
-    r_off = random.choice([-1, 1]) * random.randint(1, 3)
-    g_off = random.choice([-1, 1]) * random.randint(1, 3)
-    b_off = random.choice([-1, 1]) * random.randint(1, 3)
+def augment_matrix(params: Dict[str, object]) -> Tuple[float, ...]:
+    """Fold brightness, saturation and tint into one 3x4 RGB color matrix.
 
-    arr = np.array(img, dtype=np.int16)
-    arr[:, :, 0] += r_off
-    arr[:, :, 1] += g_off
-    arr[:, :, 2] += b_off
-    arr = np.clip(arr, 0, 255).astype(np.uint8)
-    return Image.fromarray(arr)
+    Brightness scales every channel by f, saturation blends each channel with
+    luma by s, and tint adds a constant:
+
+        out_c = s*f*c + (1-s)*f*luma(rgb) + tint_c
+
+    which is affine in RGB, so Pillow can apply it in a single uint8 pass.
+    """
+    return matrix_tuple(image_params(params))
 
 
-def augment_image(img: Image.Image) -> Image.Image:
+def apply_augment(img: Image.Image, params: Dict[str, object]) -> Image.Image:
+    """Apply one parameter set to an RGB image in a single fused pass."""
+    return img.convert("RGB", matrix=augment_matrix(params))
+
+
+def augment_image(img: Image.Image, rng: Optional[random.Random] = None) -> Image.Image:
     """Apply light augmentations to make the image pixel-unique.
 
     Input image should be 1080x1920 RGB.
     Returns augmented image (same dimensions).
     """
-    img = img.convert("RGB")
-    img = _brightness_jitter(img)
-    img = _saturation_jitter(img)
-    img = _color_tint(img)
-    return img
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return apply_augment(img, sample_augment_params(rng))
 
 
-def save_clean(img: Image.Image, output_path: Path) -> None:
-    """Save image with all metadata stripped and randomized JPEG quality.
+def augment_batch(
+    img: Image.Image,
+    count: int,
+    rng: Optional[random.Random] = None,
+) -> List[Image.Image]:
+    """Produce `count` independently augmented variants of one decoded base."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return [apply_augment(img, sample_augment_params(rng)) for _ in range(count)]
 
-    Creates a fresh image from pixel data only (no EXIF/ICC/XMP).
-    """
-    clean = Image.new(img.mode, img.size)
-    clean.putdata(list(img.getdata()))
 
-    if clean.mode not in ("RGB", "L"):
-        clean = clean.convert("RGB")
+def encode_clean(img: Image.Image, rng: Optional[random.Random] = None) -> bytes:
+    """Encode image as JPEG bytes with no metadata and randomized quality.
+
+    Pillow only writes EXIF/ICC/XMP when they are passed as save() options,
+    and a JPEG comment only from `comment` or img.info, so encoding straight
+    from the pixel buffer with those cleared yields a file with no metadata
+    segments (just the JFIF header) without rebuilding the image.
+    """
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
 
-    quality = random.randint(85, 95)
-    clean.save(
-        str(output_path),
+    quality = (rng or random).randint(85, 95)
+    buf = io.BytesIO()
+    img.save(
+        buf,
         format="JPEG",
         quality=quality,
         subsampling=0,
         exif=b"",
+        comment=b"",
+    )
+    return buf.getvalue()
+
+
+def save_clean(
+    img: Image.Image,
+    output_path: Path,
+    rng: Optional[random.Random] = None,
+) -> bytes:
+    """Save image with all metadata stripped and randomized JPEG quality.
+
+    Returns the encoded bytes so callers can hash and upload them without
+    reading the file back.
+    """
+    data = encode_clean(img, rng)
+    Path(output_path).write_bytes(data)
+    return data
+
+
+def sample_jpeg_params(rng: Optional[random.Random] = None) -> Dict[str, object]:
+    """Draw one set of JPEG-native uniquification parameters.
+
+    - offsets: constant (Y, Cb, Cr) shift, Y +/- (1-3), chroma +/- (0-2)
+    - quant_bumps: how many high-frequency table entries to raise by one
+    """
+    rng = rng or random
+    offsets = (
+        rng.choice([-1, 1]) * rng.randint(1, 3),
+        rng.choice([-1, 1]) * rng.randint(0, 2),
+        rng.choice([-1, 1]) * rng.randint(0, 2),
+    )
+    return {
+        "offsets": offsets,
+        "quant_bumps": rng.randint(0, len(_HF_QUANT_INDICES)),
+    }
+
+
+class JpegSource(NamedTuple):
+    """A JPEG decoded to YCbCr, with the tables needed to re-encode it."""
+    image: Image.Image
+    qtables: Tuple[List[int], ...]
+    subsampling: int
+
+
+def load_jpeg_source(data: bytes) -> Optional[JpegSource]:
+    """Decode a JPEG once for uniquify_jpeg, or None if it is not a plain
+    YCbCr JPEG (PNG, CMYK/grayscale JPEG, ...)."""
+    src = Image.open(io.BytesIO(data))
+    if src.format != "JPEG" or src.mode != "RGB":
+        return None
+
+    qtables = tuple(list(t) for t in src.quantization.values())
+    sampling = JpegImagePlugin.get_sampling(src)
+
+    # Decode at full size but keep libjpeg's native YCbCr output
+    src.draft("YCbCr", src.size)
+    return JpegSource(src.convert("YCbCr"), qtables, sampling if sampling != -1 else 0)
+
+
+def uniquify_jpeg(source: JpegSource, rng: Optional[random.Random] = None) -> bytes:
+    """Make a JPEG pixel-unique without an RGB decode/encode round trip.
+
+    Metadata is stripped; the source's quantization tables and chroma
+    subsampling are kept, with up to a few high-frequency entries bumped.
+    """
+    params = sample_jpeg_params(rng)
+
+    # One 3x256 lookup table shifts all planes in a single pass
+    lut = [min(255, max(0, v + off)) for off in params["offsets"] for v in range(256)]
+    shifted = source.image.point(lut)
+
+    qtables = [list(t) for t in source.qtables]
+    for table in qtables:
+        for idx in _HF_QUANT_INDICES[:params["quant_bumps"]]:
+            table[idx] = min(255, table[idx] + 1)
+
+    buf = io.BytesIO()
+    shifted.save(
+        buf,
+        format="JPEG",
+        qtables=qtables,
+        subsampling=source.subsampling,
+        exif=b"",
+        comment=b"",
     )
+    return buf.getvalue()
+
+
+def save_uniquified(
+    source: JpegSource,
+    output_path: Path,
+    rng: Optional[random.Random] = None,
+) -> bytes:
+    """uniquify_jpeg() to a file; returns the encoded bytes like save_clean."""
+    out = uniquify_jpeg(source, rng)
+    Path(output_path).write_bytes(out)
+    return out
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    """Peak signal-to-noise ratio between two same-sized RGB images, in dB."""
+    x = np.asarray(a.convert("RGB"), dtype=np.float64)
+    y = np.asarray(b.convert("RGB"), dtype=np.float64)
+    mse = float(np.mean((x - y) ** 2))
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def _benchmark(path: str, runs: int = 10) -> None:
+    """Compare pixel and JPEG-native uniquification on one file."""
+    data = Path(path).read_bytes()
+    reference = Image.open(io.BytesIO(data)).convert("RGB")
+    source = load_jpeg_source(data)
+    if source is None:
+        print(f"{path}: not a YCbCr JPEG, only the pixel path applies")
+        return
+    rng = random.Random(0)
+
+    # Both paths decode the source once and reuse it for every variant,
+    # as process_image / process_multiply do
+    def pixel() -> bytes:
+        return encode_clean(augment_image(reference, rng), rng)
+
+    def native() -> bytes:
+        return uniquify_jpeg(source, rng)
+
+    for name, fn in (("pixel", pixel), ("jpeg", native)):
+        start = time.perf_counter()
+        outputs = [fn() for _ in range(runs)]
+        ms = (time.perf_counter() - start) / runs * 1000
+        scores = [psnr(reference, Image.open(io.BytesIO(o))) for o in outputs]
+        sizes = [len(o) for o in outputs]
+        print(
+            f"{name:>5}: {ms:7.1f} ms/variant  "
+            f"PSNR {min(scores):.1f}-{max(scores):.1f} dB  "
+            f"size {min(sizes) // 1024}-{max(sizes) // 1024} KiB  "
+            f"unique {len(set(outputs))}/{runs}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python image_augmenter.py <photo.jpg> [runs]")
+        sys.exit(1)
+    _benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -11,13 +11,16 @@ This worker:
 """
 
 import modal
+import io
+import os
 import subprocess
 import random
 import hashlib
 import json
 import zipfile
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 # Define the Modal app
@@ -74,11 +77,55 @@ image = (
     .add_local_file(str(_worker_dir / "text_renderer.py"), remote_path="/helpers/text_renderer.py")
     .add_local_file(str(_worker_dir / "image_augmenter.py"), remote_path="/helpers/image_augmenter.py")
     .add_local_file(str(_worker_dir / "face_swapper.py"), remote_path="/helpers/face_swapper.py")
+    .add_local_file(str(_worker_dir / "checkpoints.py"), remote_path="/helpers/checkpoints.py")
+    .add_local_file(str(_worker_dir / "variant_executor.py"), remote_path="/helpers/variant_executor.py")
+    .add_local_file(str(_worker_dir / "source_cache.py"), remote_path="/helpers/source_cache.py")
+    .add_local_file(str(_worker_dir / "slideshow.py"), remote_path="/helpers/slideshow.py")
+    .add_local_file(str(_worker_dir / "storage.py"), remote_path="/helpers/storage.py")
+    .add_local_file(str(_worker_dir / "artifact_cache.py"), remote_path="/helpers/artifact_cache.py")
+    .add_local_file(str(_worker_dir / "perceptual_hash.py"), remote_path="/helpers/perceptual_hash.py")
+    .add_local_file(str(_worker_dir / "ffmpeg_utils.py"), remote_path="/helpers/ffmpeg_utils.py")
+    .add_local_file(str(_worker_dir / "color_lut.py"), remote_path="/helpers/color_lut.py")
 )
 
+# Cross-job cache of downloaded sources and derived artifacts (artifact_cache.py)
+ARTIFACT_CACHE_PATH = "/cache"
+artifact_volume = modal.Volume.from_name("creator-engine-artifacts", create_if_missing=True)
+
+# Encoded variants are cached by (source version, settings, variant seed,
+# RESULT_VERSION), so a retried or re-run job reuses its outputs. Bump this
+# whenever a change alters what a variant encodes to.
+RESULT_VERSION = 4
+
+# Video faceswap checkpoints an encoded segment every CHECKPOINT_FRAMES frames
+# so a retried job resumes instead of starting over
+CHECKPOINT_FRAMES = 300
+
+# Extra attempts at a faceswap job after its container dies (timeout,
+# preemption) or a video job fails transiently; video resumes from its last
+# checkpointed segment
+FACESWAP_RETRIES = 2
+
+# Faceswap variants are encoded from one decode of the swapped frames, at most
+# this many outputs per FFmpeg pass (each libx264 instance holds its own buffers)
+FUSED_VARIANTS_PER_PASS = 6
+
+# Batch image faceswap: source images swapped concurrently on shared models
+FACESWAP_BATCH_WORKERS = 4
+
+# Multi-source image jobs download/decode this many upcoming sources ahead
+SOURCE_PREFETCH = 4
+
+# Variants are fingerprinted with perceptual hashes (perceptual_hash.py); one
+# closer than the job's minimum distance (in bits, 0 = record only) to the
+# source or an earlier variant is regenerated with a new seed, at most this
+# many times
+MAX_REGENERATIONS = 2
+
 
 @app.function(
     image=image,
+    volumes={ARTIFACT_CACHE_PATH: artifact_volume},
     timeout=600,  # 10 minutes max
     cpu=2,
     memory=4096,  # 4GB RAM
@@ -108,9 +155,19 @@ def process_video(
         Dict with status, output paths, and variant details
     """
     from supabase import create_client, Client
+    import sys
+
+    sys.path.insert(0, "/helpers")
+    from storage import open_storage
+    from artifact_cache import content_key, open_artifact_cache
+    from variant_executor import job_seed, variant_seed
+    from perceptual_hash import UniquenessIndex, from_hex, to_hex, video_fingerprint
+    from ffmpeg_utils import TempoTracks, audio_codec, detect_watermarks
 
-    # Initialize Supabase client
+    # Initialize Supabase client (database) and storage backend (transfers)
     supabase: Client = create_client(supabase_url, supabase_key)
+    storage = open_storage(supabase_url, supabase_key)
+    artifacts = open_artifact_cache(artifact_volume, ARTIFACT_CACHE_PATH)
 
     # Create working directory
     work_dir = Path(f"/tmp/{job_id}")
@@ -126,29 +183,111 @@ def process_video(
 
         # Download source video
         print(f"Downloading source video: {source_path}")
-        response = supabase.storage.from_("videos").download(source_path)
-        input_path.write_bytes(response)
-
-        # Get video info
-        video_info = get_video_info(str(input_path))
+        artifacts.fetch_to(storage, "videos", source_path, input_path)
+
+        # Get video info (cached per source version)
+        source_key = artifacts.object_key(storage, "videos", source_path)
+        video_info = artifacts.memo_json(
+            "probe",
+            source_key and content_key(source_key, "probe-v1"),
+            lambda: get_video_info(str(input_path)),
+        )
         print(f"Video info: {video_info}")
 
+        # Variants are seeded from the job (or an explicit settings seed), so
+        # a re-run reproduces the same transformations
+        seed = int(settings.get("seed", job_seed(job_id)))
+
+        # Perceptual fingerprints of sampled frames, compared against the
+        # source and earlier variants
+        duration = float(video_info.get("format", {}).get("duration", 0) or 0)
+
+        def fingerprint_source() -> Optional[str]:
+            fingerprint = video_fingerprint(input_path, duration)
+            return to_hex(fingerprint) if fingerprint is not None else None
+
+        source_fp = artifacts.memo_json(
+            "fingerprint", source_key and content_key(source_key, "phash-v2"), fingerprint_source
+        )
+        uniqueness_index = UniquenessIndex(
+            from_hex(source_fp) if source_fp else None,
+            settings.get("min_phash_distance", 0),
+        )
+        max_regenerations = settings.get("max_regenerations", MAX_REGENERATIONS)
+
+        # Static overlays are detected once per source version and removed
+        # with delogo in every variant
+        watermarks = []
+        if settings.get("remove_watermark", False):
+            watermarks = artifacts.memo_json(
+                "watermark",
+                source_key and content_key(source_key, "watermark-v1"),
+                lambda: detect_watermarks(str(input_path)),
+            )
+            print(f"Watermark regions: {watermarks or 'none found'}")
+
+        # Encodes are cached by source version, settings and variant seed
+        def result_key(vseed: int) -> Optional[str]:
+            return source_key and content_key(source_key, "video", settings, vseed, RESULT_VERSION)
+
+        # Audio for the tempo of every variant that will be encoded is made in
+        # one pass (or the source track is copied when the tempo is effectively
+        # unchanged); cached variants need none, regenerations get theirs on
+        # demand
+        tempo_tracks = TempoTracks(input_path, audio_codec(video_info), work_dir / "audio")
+        tempo_tracks.prepare(
+            generate_transformations(settings, random.Random(variant_seed(seed, i)))["speed"]
+            for i in range(variant_count)
+            if not artifacts.contains("result", result_key(variant_seed(seed, i)))
+        )
+
+        # Each encode also writes a poster frame (about 1s in) and, when
+        # requested, a low-bitrate faststart preview for the web player
+        fps = _frame_rate(video_info)
+        poster_frame = int(min(1.0, duration / 2) * fps)
+        web_preview = settings.get("web_preview", False)
+
         # Process variants
         variants = []
         for i in range(variant_count):
             variant_name = f"variant_{i+1:03d}.mp4"
             variant_path = output_dir / variant_name
+            poster_path = output_dir / f"variant_{i+1:03d}_poster.jpg"
+            preview_path = output_dir / f"variant_{i+1:03d}_web.mp4" if web_preview else None
+            extras = [poster_path] + ([preview_path] if preview_path else [])
+
+            def render(attempt: int) -> Dict[str, Any]:
+                # Generate seeded random transformations
+                vseed = variant_seed(seed, i, attempt)
+                transformations = generate_transformations(settings, random.Random(vseed))
+                transformations["seed"] = vseed
+                if watermarks:
+                    transformations["watermarks"] = watermarks
+
+                def encode(out: Path) -> None:
+                    process_single_variant(
+                        str(input_path),
+                        str(out),
+                        transformations,
+                        watermarks,
+                        tempo_tracks.track(transformations["speed"]),
+                        (str(poster_path), poster_frame),
+                        preview_path and str(preview_path),
+                    )
 
-            # Generate random transformations
-            transformations = generate_transformations(settings)
+                # Apply transformations with FFmpeg, unless an encode of the
+                # same source, settings and seed is already cached
+                if artifacts.memo_file("result", result_key(vseed), variant_path, encode, extras):
+                    print(f"Variant {i+1}/{variant_count} reused from result cache")
+                return transformations
 
-            # Apply transformations with FFmpeg
-            process_single_variant(
-                str(input_path),
-                str(variant_path),
-                transformations,
-                settings.get("remove_watermark", False),
+            transformations, uniqueness = uniqueness_index.accept(
+                render,
+                lambda t: video_fingerprint(variant_path, duration),
+                max_regenerations,
             )
+            if uniqueness:
+                transformations["uniqueness"] = uniqueness
 
             # Calculate file hash for uniqueness verification
             file_hash = calculate_file_hash(str(variant_path))
@@ -162,17 +301,18 @@ def process_video(
                 "transformations": transformations,
             })
 
-            # Upload variant to Supabase Storage
+            # Upload variant, poster and preview to Supabase Storage together
             variant_storage_path = f"{user_id}/{job_id}/{variant_name}"
-            try:
-                with open(variant_path, "rb") as vf:
-                    supabase.storage.from_("outputs").upload(
-                        variant_storage_path,
-                        vf.read(),
-                        {"content-type": "video/mp4"},
-                    )
-            except Exception as upload_err:
-                print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
+            uploads = [(variant_storage_path, variant_path, "video/mp4")]
+            if poster_path.exists():
+                transformations["poster_path"] = f"{user_id}/{job_id}/{poster_path.name}"
+                uploads.append((transformations["poster_path"], poster_path, "image/jpeg"))
+            if preview_path and preview_path.exists():
+                transformations["preview_path"] = f"{user_id}/{job_id}/{preview_path.name}"
+                uploads.append((transformations["preview_path"], preview_path, "video/mp4"))
+            for (upload_path, _, _), upload_err in zip(uploads, storage.upload_many("outputs", uploads)):
+                if upload_err is not None:
+                    print(f"Warning: Failed to upload {upload_path}: {upload_err}")
 
             # Insert variant record into database
             try:
@@ -191,6 +331,8 @@ def process_video(
             update_job_status(supabase, job_id, "processing", progress, i + 1)
             print(f"Variant {i+1}/{variant_count} complete")
 
+        print(f"Perceptual uniqueness: {uniqueness_index.summary()}")
+
         # Create and upload ZIP archive
         print("Finalizing: creating ZIP archive...")
         zip_path = work_dir / f"{job_id}_variants.zip"
@@ -199,12 +341,7 @@ def process_video(
         # Upload ZIP to Supabase Storage
         output_storage_path = f"{user_id}/{job_id}/variants.zip"
         try:
-            with open(zip_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    output_storage_path,
-                    f.read(),
-                    {"content-type": "application/zip"},
-                )
+            storage.upload_file("outputs", output_storage_path, zip_path, "application/zip")
         except Exception as zip_err:
             print(f"Warning: Failed to upload ZIP: {zip_err}")
             output_storage_path = None
@@ -237,6 +374,9 @@ def process_video(
         raise
 
     finally:
+        print(f"Storage transfers: {storage.metrics.summary()}")
+        print(f"Artifact cache: {artifacts.summary()}")
+        artifacts.commit()
         # Cleanup
         import shutil
         shutil.rmtree(work_dir, ignore_errors=True)
@@ -251,6 +391,18 @@ def update_job_status(supabase, job_id: str, status: str, progress: int, variant
     }).eq("id", job_id).execute()
 
 
+def save_variant_row(supabase, job_id: str, variant_index: int, row: Dict[str, Any]) -> None:
+    """Write a variant row, upserted on (job_id, variant_index).
+
+    A retried job rewrites the rows of variants it already produced instead
+    of adding duplicates (their storage objects are overwritten in place).
+    """
+    supabase.table("variants").upsert(
+        {"job_id": job_id, "variant_index": variant_index, **row},
+        on_conflict="job_id,variant_index",
+    ).execute()
+
+
 def get_video_info(input_path: str) -> Dict[str, Any]:
     """Get video metadata using ffprobe."""
     cmd = [
@@ -265,8 +417,29 @@ def get_video_info(input_path: str) -> Dict[str, Any]:
     return json.loads(result.stdout) if result.returncode == 0 else {}
 
 
-def generate_transformations(settings: Dict[str, Any]) -> Dict[str, float]:
-    """Generate random transformation values within configured ranges."""
+def _frame_rate(video_info: Dict[str, Any], default: float = 30.0) -> float:
+    """Frame rate of the first video stream in get_video_info() output."""
+    for stream in video_info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            num, _, den = stream.get("r_frame_rate", "").partition("/")
+            try:
+                rate = float(num) / float(den or 1)
+            except (ValueError, ZeroDivisionError):
+                return default
+            return rate or default
+    return default
+
+
+def generate_transformations(
+    settings: Dict[str, Any],
+    rng: Optional[random.Random] = None,
+) -> Dict[str, float]:
+    """Generate random transformation values within configured ranges.
+
+    Draws from rng (a per-variant seeded RNG) so variants are reproducible;
+    falls back to the global random module.
+    """
+    rng = rng or random
     brightness_range = settings.get("brightness_range", [-0.03, 0.03])
     saturation_range = settings.get("saturation_range", [0.97, 1.03])
     hue_range = settings.get("hue_range", [-5, 5])
@@ -274,82 +447,154 @@ def generate_transformations(settings: Dict[str, Any]) -> Dict[str, float]:
     speed_range = settings.get("speed_range", [0.98, 1.02])
 
     return {
-        "brightness": random.uniform(*brightness_range),
-        "saturation": random.uniform(*saturation_range),
-        "hue": random.uniform(*hue_range),
-        "crop_px": random.randint(*crop_px_range),
-        "speed": random.uniform(*speed_range),
+        "brightness": rng.uniform(*brightness_range),
+        "saturation": rng.uniform(*saturation_range),
+        "hue": rng.uniform(*hue_range),
+        "crop_px": rng.randint(*crop_px_range),
+        "speed": rng.uniform(*speed_range),
         # Add slight noise seed for reproducibility
-        "noise_seed": random.randint(0, 999999),
+        "noise_seed": rng.randint(0, 999999),
     }
 
 
+def _variant_graph(
+    input_path: str,
+    transformations: Dict[str, float],
+    watermarks: Optional[List[Dict[str, int]]] = None,
+    audio_track: Optional[str] = None,
+    poster: Optional[Tuple[str, int]] = None,
+    preview_path: Optional[str] = None,
+):
+    """FilterGraph for one variant: watermark removal, color jitter, edge crop, tempo.
+
+    The variant's color jitter runs as a single hue filter in YUV. With an
+    audio_track (already at the variant's tempo, see TempoTracks) the audio
+    is stream-copied; otherwise it is re-timed with atempo here. A poster
+    (path, frame number) and a web preview are extra outputs of the same
+    graph, cut from the already-filtered frames.
+    """
+    from ffmpeg_utils import FilterGraph
+    from color_lut import hue_args, video_params
+
+    graph = (
+        FilterGraph(input_path)
+        # delogo runs first, while region coordinates still match the source
+        .delogo(watermarks or [])
+        # Brightness/saturation/hue: table lookups on the YUV planes
+        .hue(*hue_args(video_params(transformations)))
+        # Crop edges (removes crop_px pixels from each side)
+        .crop_edges(transformations["crop_px"])
+        .pixel_format("yuv420p")
+        .strip_metadata()
+    )
+    if poster:
+        graph.poster(*poster)
+    if preview_path:
+        graph.web_preview(preview_path)
+    if audio_track:
+        return graph.audio_track(audio_track)
+    # Note: atempo range is 0.5-2.0, so we need to use a compatible speed
+    return graph.atempo(transformations["speed"])
+
+
 def process_single_variant(
     input_path: str,
     output_path: str,
     transformations: Dict[str, float],
-    remove_watermark: bool = False,
+    watermarks: Optional[List[Dict[str, int]]] = None,
+    audio_track: Optional[str] = None,
+    poster: Optional[Tuple[str, int]] = None,
+    preview_path: Optional[str] = None,
 ) -> None:
     """
     Process a single video variant using FFmpeg.
 
-    Applies:
-    - Brightness/saturation/hue adjustments
+    Applies (as one FilterGraph, so a single decode for the variant and its
+    optional poster frame and web preview):
+    - Watermark removal (delogo over each detected region in watermarks)
+    - Brightness/saturation/hue adjustments (one hue filter, see color_lut.py)
     - Edge cropping
     - Speed variation
     - Metadata stripping
-    - Audio pitch adjustment
+    - Audio pitch adjustment (or a prepared audio_track, stream-copied)
     """
-    brightness = transformations["brightness"]
-    saturation = transformations["saturation"]
-    hue = transformations["hue"]
-    crop_px = transformations["crop_px"]
-    speed = transformations["speed"]
-
-    # Build video filter chain
-    video_filters = [
-        # Color adjustments
-        f"eq=brightness={brightness}:saturation={saturation}",
-        f"hue=h={hue}",
-        # Crop edges (removes crop_px pixels from each side)
-        f"crop=iw-{crop_px*2}:ih-{crop_px*2}:{crop_px}:{crop_px}",
-    ]
+    graph = _variant_graph(
+        input_path, transformations, watermarks, audio_track, poster, preview_path
+    )
+    result = graph.run(output_path)
 
-    # Build audio filter for tempo adjustment
-    # Note: atempo range is 0.5-2.0, so we need to use a compatible speed
-    audio_filter = f"atempo={speed}"
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed: {result.stderr}")
 
-    # Combine filters
-    vf = ",".join(video_filters)
 
-    # FFmpeg command
-    cmd = [
-        "ffmpeg",
-        "-y",  # Overwrite output
-        "-i", input_path,
-        # Video processing
-        "-vf", vf,
-        # Audio processing
-        "-af", audio_filter,
-        # Strip all metadata
-        "-map_metadata", "-1",
-        "-fflags", "+bitexact",
-        "-flags:v", "+bitexact",
-        "-flags:a", "+bitexact",
-        # Encoding settings
-        "-c:v", "libx264",
-        "-preset", "fast",
-        "-crf", "23",
-        "-c:a", "aac",
-        "-b:a", "128k",
-        # Output
-        output_path,
+def process_variants_fused(
+    video_input: List[str],
+    audio,
+    variants: List[Tuple[str, Dict[str, float]]],
+    clean_output: Optional[str] = None,
+) -> None:
+    """
+    Encode several variants (and optionally a clean copy) in one FFmpeg pass.
+
+    The video input is decoded once and split into one filter branch per
+    output, each with the same filters process_single_variant applies, so N
+    variants cost one decode instead of N and no intermediate file is needed.
+
+    Args:
+        video_input: FFmpeg input args for the video, e.g. ["-i", path] or an
+            image-sequence input ["-framerate", "30", "-i", "frame_%06d.png"]
+        audio: TempoTracks of the source audio (each output muxes its tempo's
+            track by stream copy), or None for no audio
+        variants: (output_path, transformations) per variant
+        clean_output: Optional path for an unfiltered encode of the input
+    """
+    from ffmpeg_utils import METADATA_STRIP_ARGS
+
+    outputs = [(path, t) for path, t in variants]
+    if clean_output:
+        outputs.append((clean_output, None))
+    n = len(outputs)
+
+    # Each branch runs the stages of the variant's FilterGraph
+    stages = [
+        _variant_graph("", t) if t is not None else None
+        for path, t in outputs
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Convert once before splitting: image-sequence inputs are RGB
+    graph = [f"[0:v]format=yuv420p,split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    for i, branch in enumerate(stages):
+        chain = ",".join(branch.video_filters) if branch else "null"
+        graph.append(f"[s{i}]{chain}[v{i}]")
+
+    # Audio is not decoded here: every output stream-copies the track
+    # prepared at its tempo (one input per distinct track)
+    cmd = ["ffmpeg", "-y", *video_input]
+    track_inputs: Dict[str, int] = {}
+    tracks = []
+    for _, t in outputs:
+        track = audio.track(t["speed"] if t is not None else 1.0) if audio else None
+        if track is not None and track not in track_inputs:
+            track_inputs[track] = len(track_inputs) + 1
+            cmd += ["-i", track]
+        tracks.append(track)
+    cmd += ["-filter_complex", ";".join(graph)]
+
+    for i, (path, _) in enumerate(outputs):
+        cmd += ["-map", f"[v{i}]"]
+        if tracks[i] is not None:
+            cmd += ["-map", f"{track_inputs[tracks[i]]}:a:0?", "-c:a", "copy"]
+        cmd += [
+            *METADATA_STRIP_ARGS,
+            "-c:v", "libx264",
+            "-preset", "fast",
+            "-crf", "23",
+            path,
+        ]
 
+    result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
-        raise RuntimeError(f"FFmpeg failed: {result.stderr}")
+        raise RuntimeError(f"FFmpeg fused variant encode failed: {result.stderr}")
 
 
 def calculate_file_hash(file_path: str) -> str:
@@ -361,6 +606,11 @@ def calculate_file_hash(file_path: str) -> str:
     return hasher.hexdigest()
 
 
+def calculate_bytes_hash(data: bytes) -> str:
+    """MD5 of an in-memory file, matching calculate_file_hash."""
+    return hashlib.md5(data).hexdigest()
+
+
 def create_zip_archive(variants: List[Dict], zip_path: str) -> None:
     """Create a ZIP archive of all variants."""
     with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
@@ -400,6 +650,7 @@ def start_processing(item: dict):
 
 @app.function(
     image=image,
+    volumes={ARTIFACT_CACHE_PATH: artifact_volume},
     timeout=600,
     cpu=2,
     memory=4096,
@@ -425,8 +676,8 @@ def process_captions(
 
     For each caption:
     1. Resize/crop source photo to 1080x1920
-    2. Render caption text with Pillow
-    3. Apply light augmentation (brightness, saturation, color tint)
+    2. Apply light augmentation (brightness, saturation, color tint)
+    3. Composite the caption sprite (rendered once per caption with Pillow)
     4. Strip metadata and save with randomized JPEG quality
     5. Upload variant to Supabase Storage
 
@@ -438,15 +689,25 @@ def process_captions(
 
     # Add the mount path so Python can find our helper modules
     sys.path.insert(0, "/helpers")
-    from text_renderer import resize_and_crop, render_caption
-    from image_augmenter import augment_image, save_clean
+    from storage import open_storage
+    from artifact_cache import content_key, open_artifact_cache
+    from text_renderer import load_and_fit, render_caption
+    from image_augmenter import augment_image, encode_clean
+    from variant_executor import job_seed, map_ordered, variant_rng, variant_seed
+    from source_cache import SourceImageCache
+    from slideshow import BackgroundSlideshow
+    from perceptual_hash import UniquenessIndex, fingerprint_bytes
 
     supabase: Client = create_client(supabase_url, supabase_key)
+    storage = open_storage(supabase_url, supabase_key)
+    artifacts = open_artifact_cache(artifact_volume, ARTIFACT_CACHE_PATH)
 
     work_dir = Path(f"/tmp/{job_id}")
     work_dir.mkdir(parents=True, exist_ok=True)
     output_dir = work_dir / "variants"
     output_dir.mkdir(exist_ok=True)
+    source_cache = None
+    slideshow = None
 
     font_path = "/assets/fonts/Anton-Regular.ttf"
     if not Path(font_path).exists():
@@ -456,77 +717,65 @@ def process_captions(
         update_job_status(supabase, job_id, "processing", 0)
 
         variants = []
+        seed = job_seed(job_id)
+
+        def fit_photo(img_bytes: bytes) -> Image.Image:
+            # The fitted 1080x1920 base is cached by photo content, so other
+            # caption jobs on the same photo skip decode + resize
+            key = content_key(img_bytes, "fit-v1") if artifacts.enabled else None
+            return artifacts.memo_image("fit", key, lambda: load_and_fit(img_bytes))
+
+        def render_variant(
+            i: int,
+            source_key: Optional[str],
+            load_base: Callable[[], Image.Image],
+            caption: str,
+        ) -> Tuple[bytes, str, Any]:
+            def encode() -> bytes:
+                # Light augmentation (returns a fresh image), then composite
+                # the cached caption sprite onto it in place, metadata-free
+                rng = variant_rng(seed, i)
+                augmented = augment_image(load_base(), rng)
+                render_caption(augmented, caption, font_path, font_size, position, inplace=True)
+                return encode_clean(augmented, rng)
+
+            # The source is only loaded when no cached result exists
+            result_key = source_key and content_key(
+                source_key, "caption", caption, font_size, position,
+                variant_seed(seed, i), RESULT_VERSION,
+            )
+            data = artifacts.memo_bytes("result", result_key, encode)
+            (output_dir / f"variant_{i+1:03d}.jpg").write_bytes(data)
+            return data, calculate_bytes_hash(data), fingerprint_bytes(data)
 
         if photos:
             # Multi-photo mode: each photo has its own file_path + caption
             variant_count = len(photos)
-            image_cache: Dict[str, Image.Image] = {}  # path -> resized PIL Image
+            photo_paths = [p["file_path"] for p in photos]
 
-            for i, photo_entry in enumerate(photos):
-                photo_path = photo_entry["file_path"]
-                caption = photo_entry["caption"]
-                variant_name = f"variant_{i+1:03d}.jpg"
-                variant_path = output_dir / variant_name
-
-                # Download and cache image
-                if photo_path not in image_cache:
-                    print(f"Downloading photo: {photo_path}")
-                    img_bytes = supabase.storage.from_("images").download(photo_path)
-                    tmp_path = work_dir / f"photo_{len(image_cache)}.jpg"
-                    tmp_path.write_bytes(img_bytes)
-                    img = Image.open(tmp_path).convert("RGB")
-                    image_cache[photo_path] = resize_and_crop(img)
-
-                base_img = image_cache[photo_path]
-
-                # Render caption on a copy of the base image
-                captioned = render_caption(base_img, caption, font_path, font_size, position)
+            def fetch_photo(photo_path: str) -> bytes:
+                print(f"Downloading photo: {photo_path}")
+                return artifacts.fetch(storage, "images", photo_path)
 
-                # Apply light augmentation
-                augmented = augment_image(captioned)
+            # Resized photos are cached under a byte budget; the next few
+            # photos are downloaded and decoded while earlier ones render
+            source_cache = SourceImageCache(fetch_photo, fit_photo)
 
-                # Save with metadata stripped
-                save_clean(augmented, variant_path)
+            def render_photo(item: Tuple[int, Dict[str, str]]) -> Tuple[bytes, str, Any]:
+                i, photo_entry = item
+                photo_path = photo_entry["file_path"]
 
-                file_size = variant_path.stat().st_size
-                file_hash = calculate_file_hash(str(variant_path))
+                def load_base() -> Image.Image:
+                    source_cache.prefetch(photo_paths[i + 1:i + 1 + SOURCE_PREFETCH])
+                    return source_cache.get(photo_path)
 
-                variants.append({
-                    "name": variant_name,
-                    "path": str(variant_path),
-                    "hash": file_hash,
-                    "size": file_size,
-                    "caption": caption,
-                })
+                source_key = artifacts.object_key(storage, "images", photo_path)
+                return render_variant(i, source_key, load_base, photo_entry["caption"])
 
-                # Upload variant to Supabase Storage
-                variant_storage_path = f"{user_id}/{job_id}/{variant_name}"
-                try:
-                    with open(variant_path, "rb") as vf:
-                        supabase.storage.from_("outputs").upload(
-                            variant_storage_path,
-                            vf.read(),
-                            {"content-type": "image/jpeg"},
-                        )
-                except Exception as upload_err:
-                    print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
-
-                # Insert variant record
-                try:
-                    supabase.table("variants").insert({
-                        "job_id": job_id,
-                        "file_path": variant_storage_path,
-                        "file_size": file_size,
-                        "file_hash": file_hash,
-                        "caption_text": caption,
-                        "transformations": {"font_size": font_size, "position": position},
-                    }).execute()
-                except Exception as db_err:
-                    print(f"Warning: Failed to insert variant record {variant_name}: {db_err}")
-
-                progress = int((i + 1) / variant_count * 100)
-                update_job_status(supabase, job_id, "processing", progress, i + 1)
-                print(f"Caption variant {i+1}/{variant_count} complete")
+            rendered = (
+                (i, entry["caption"], result)
+                for (i, entry), result in map_ordered(render_photo, enumerate(photos))
+            )
 
         else:
             # Single-photo mode (legacy): one source image + list of captions
@@ -534,106 +783,106 @@ def process_captions(
 
             # Download source photo from images bucket
             print(f"Downloading source photo: {source_path}")
-            response = supabase.storage.from_("images").download(source_path)
-            input_path = work_dir / "input.jpg"
-            input_path.write_bytes(response)
+            response = artifacts.fetch(storage, "images", source_path)
 
-            # Resize/crop once (all variants share the same base)
-            base_img = Image.open(input_path).convert("RGB")
-            base_img = resize_and_crop(base_img)
+            # Decode and resize/crop once (all variants share the same base)
+            base_img = fit_photo(response)
+            source_key = artifacts.object_key(storage, "images", source_path)
 
-            for i, caption in enumerate(captions):
-                variant_name = f"variant_{i+1:03d}.jpg"
-                variant_path = output_dir / variant_name
+            rendered = (
+                (i, caption, result)
+                for (i, caption), result in map_ordered(
+                    lambda item: render_variant(item[0], source_key, lambda: base_img, item[1]),
+                    enumerate(captions),
+                )
+            )
 
-                # Render caption on a copy of the base image
-                captioned = render_caption(base_img, caption, font_path, font_size, position)
+        # Optionally encode a slideshow video on a background thread, fed
+        # each variant as soon as it is rendered
+        video_path = work_dir / "slideshow.mp4"
+        if generate_video and variant_count >= 2:
+            print("Generating slideshow video...")
+            slideshow = BackgroundSlideshow(video_path)
 
-                # Apply light augmentation
-                augmented = augment_image(captioned)
+        # Captions already make variants distinct, so perceptual distances
+        # between them are recorded but never trigger regeneration
+        uniqueness_index = UniquenessIndex()
 
-                # Save with metadata stripped
-                save_clean(augmented, variant_path)
+        # Variants are rendered in parallel; uploads, records and progress
+        # are handled here in variant order
+        for i, caption, (data, file_hash, fingerprint) in rendered:
+            uniqueness = uniqueness_index.check(fingerprint)
+            uniqueness_index.add(fingerprint)
+            variant_name = f"variant_{i+1:03d}.jpg"
+            variant_path = output_dir / variant_name
+            file_size = len(data)
 
-                file_size = variant_path.stat().st_size
-                file_hash = calculate_file_hash(str(variant_path))
+            variants.append({
+                "name": variant_name,
+                "path": str(variant_path),
+                "hash": file_hash,
+                "size": file_size,
+                "caption": caption,
+            })
+            if slideshow is not None:
+                slideshow.add(variant_path)
 
-                variants.append({
-                    "name": variant_name,
-                    "path": str(variant_path),
-                    "hash": file_hash,
-                    "size": file_size,
-                    "caption": caption,
-                })
+            # Upload variant to Supabase Storage
+            variant_storage_path = f"{user_id}/{job_id}/{variant_name}"
+            try:
+                storage.upload("outputs", variant_storage_path, data, "image/jpeg")
+            except Exception as upload_err:
+                print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
 
-                # Upload variant to Supabase Storage
-                variant_storage_path = f"{user_id}/{job_id}/{variant_name}"
-                try:
-                    with open(variant_path, "rb") as vf:
-                        supabase.storage.from_("outputs").upload(
-                            variant_storage_path,
-                            vf.read(),
-                            {"content-type": "image/jpeg"},
-                        )
-                except Exception as upload_err:
-                    print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
-
-                # Insert variant record
-                try:
-                    supabase.table("variants").insert({
-                        "job_id": job_id,
-                        "file_path": variant_storage_path,
-                        "file_size": file_size,
-                        "file_hash": file_hash,
-                        "caption_text": caption,
-                        "transformations": {"font_size": font_size, "position": position},
-                    }).execute()
-                except Exception as db_err:
-                    print(f"Warning: Failed to insert variant record {variant_name}: {db_err}")
-
-                progress = int((i + 1) / variant_count * 100)
-                update_job_status(supabase, job_id, "processing", progress, i + 1)
-                print(f"Caption variant {i+1}/{variant_count} complete")
+            # Insert variant record
+            try:
+                supabase.table("variants").insert({
+                    "job_id": job_id,
+                    "file_path": variant_storage_path,
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                    "caption_text": caption,
+                    "transformations": {
+                        "font_size": font_size,
+                        "position": position,
+                        "seed": variant_seed(seed, i),
+                        "uniqueness": uniqueness,
+                    },
+                }).execute()
+            except Exception as db_err:
+                print(f"Warning: Failed to insert variant record {variant_name}: {db_err}")
 
-        # Optionally generate slideshow video
-        output_video_path = None
-        if generate_video and len(variants) >= 2:
-            print("Generating slideshow video...")
-            video_path = work_dir / "slideshow.mp4"
-            _generate_slideshow(
-                [Path(v["path"]) for v in variants],
-                video_path,
-            )
-            if video_path.exists():
-                video_storage_path = f"{user_id}/{job_id}/slideshow.mp4"
-                try:
-                    with open(video_path, "rb") as vf:
-                        supabase.storage.from_("outputs").upload(
-                            video_storage_path,
-                            vf.read(),
-                            {"content-type": "video/mp4"},
-                        )
-                    output_video_path = video_storage_path
-                except Exception as vid_err:
-                    print(f"Warning: Failed to upload slideshow video: {vid_err}")
+            progress = int((i + 1) / variant_count * 100)
+            update_job_status(supabase, job_id, "processing", progress, i + 1)
+            print(f"Caption variant {i+1}/{variant_count} complete")
 
-        # Create ZIP archive
+        print(f"Perceptual uniqueness: {uniqueness_index.summary()}")
+
+        # Create ZIP archive (the slideshow keeps encoding meanwhile)
         print("Creating ZIP archive...")
         zip_path = work_dir / f"{job_id}_variants.zip"
         create_zip_archive(variants, str(zip_path))
 
         output_zip_storage = f"{user_id}/{job_id}/variants.zip"
         try:
-            with open(zip_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    output_zip_storage,
-                    f.read(),
-                    {"content-type": "application/zip"},
-                )
+            storage.upload_file("outputs", output_zip_storage, zip_path, "application/zip")
         except Exception as zip_err:
             print(f"Warning: Failed to upload ZIP: {zip_err}")
             output_zip_storage = None
 
+        # Wait for the slideshow and upload it (failure is non-fatal)
+        output_video_path = None
+        if slideshow is not None:
+            finished = slideshow.finish()
+            slideshow = None
+            if finished:
+                video_storage_path = f"{user_id}/{job_id}/slideshow.mp4"
+                try:
+                    storage.upload_file("outputs", video_storage_path, video_path, "video/mp4")
+                    output_video_path = video_storage_path
+                except Exception as vid_err:
+                    print(f"Warning: Failed to upload slideshow video: {vid_err}")
+
         # Mark job completed
         supabase.table("jobs").update({
             "status": "completed",
@@ -663,6 +912,13 @@ def process_captions(
         raise
 
     finally:
+        print(f"Storage transfers: {storage.metrics.summary()}")
+        print(f"Artifact cache: {artifacts.summary()}")
+        artifacts.commit()
+        if slideshow is not None:
+            slideshow.abort()
+        if source_cache is not None:
+            source_cache.close()
         import shutil
         shutil.rmtree(work_dir, ignore_errors=True)
 
@@ -673,9 +929,11 @@ def process_captions(
 
 @app.function(
     image=image,
+    volumes={ARTIFACT_CACHE_PATH: artifact_volume},
     timeout=900,  # 15 minutes max (video frame-by-frame is slow)
     cpu=4,
     memory=8192,  # 8GB RAM for models
+    retries=modal.Retries(max_retries=FACESWAP_RETRIES, initial_delay=5.0, backoff_coefficient=2.0),
 )
 def process_faceswap(
     job_id: str,
@@ -687,11 +945,14 @@ def process_faceswap(
     user_id: str,
     supabase_url: str,
     supabase_key: str,
+    images: List[str] = None,
 ) -> Dict[str, Any]:
     """
-    Process a video or image with face swapping.
+    Process a video or image(s) with face swapping.
 
     For images: swap face, optionally generate augmented variants.
+    For image batches (images = list of 'images' bucket paths): swap the same
+    reference face into every image on a shared-model worker pool, one ZIP.
     For videos: extract frames, swap face per frame, reassemble, optionally generate FFmpeg variants.
     """
     from supabase import create_client, Client
@@ -699,22 +960,45 @@ def process_faceswap(
     import sys
 
     sys.path.insert(0, "/helpers")
+    from storage import is_transient, open_storage
+    from artifact_cache import open_artifact_cache
+    from checkpoints import ATTEMPTS_NAME, start_attempt
     from face_swapper import (
         _get_face_analyser,
         _get_swapper,
         _get_enhancer,
-        swap_face_in_image,
+        get_reference_face,
     )
 
     supabase: Client = create_client(supabase_url, supabase_key)
+    storage = open_storage(supabase_url, supabase_key)
+    artifacts = open_artifact_cache(artifact_volume, ARTIFACT_CACHE_PATH)
 
     work_dir = Path(f"/tmp/{job_id}")
     work_dir.mkdir(parents=True, exist_ok=True)
     output_dir = work_dir / "variants"
     output_dir.mkdir(exist_ok=True)
 
+    # Video attempts are counted next to the checkpoints, so only the last
+    # one Modal will run reports the job as failed
+    is_video = source_type != "image"
+    attempt, final_attempt = 1, True
+
     try:
-        update_job_status(supabase, job_id, "processing", 0)
+        if is_video:
+            attempt = start_attempt(_checkpoint_store(storage, user_id, job_id))
+            final_attempt = attempt > FACESWAP_RETRIES
+            if attempt > 1:
+                print(f"Attempt {attempt}/{FACESWAP_RETRIES + 1}, resuming from checkpoints")
+
+        # A rerun (e.g. a rescheduled container) starts from a clean error state
+        supabase.table("jobs").update({
+            "status": "processing",
+            "progress": 0,
+            "variants_completed": 0,
+            "error_message": None,
+            "error_code": None,
+        }).eq("id", job_id).execute()
 
         # Initialize models once (reused across all frames/variants)
         print("Loading face swap models...")
@@ -724,31 +1008,49 @@ def process_faceswap(
 
         # Download reference face
         print(f"Downloading reference face: {face_path}")
-        ref_bytes = supabase.storage.from_("faces").download(face_path)
-        ref_path = work_dir / "reference.jpg"
-        ref_path.write_bytes(ref_bytes)
+        ref_path = artifacts.fetch_to(storage, "faces", face_path, work_dir / "reference.jpg")
         ref_img = cv2.imread(str(ref_path))
 
         if ref_img is None:
             raise ValueError("Failed to read reference face image")
 
-        if source_type == "image":
+        # Analyse the reference once; every swap reuses its embedding
+        ref_face = get_reference_face(ref_img, analyser)
+
+        if source_type == "image" and images:
+            result = _process_faceswap_batch(
+                supabase, storage, artifacts, job_id, images, ref_face,
+                variant_count, swap_only, user_id, work_dir, output_dir,
+                analyser, swapper, enhancer,
+            )
+        elif source_type == "image":
             result = _process_faceswap_image(
-                supabase, job_id, source_path, ref_img,
+                supabase, storage, artifacts, job_id, source_path, ref_face,
                 variant_count, swap_only, user_id, work_dir, output_dir,
                 analyser, swapper, enhancer,
             )
         else:
             result = _process_faceswap_video(
-                supabase, job_id, source_path, ref_img,
+                supabase, storage, artifacts, job_id, source_path, face_path, ref_face,
                 variant_count, swap_only, user_id, work_dir, output_dir,
                 analyser, swapper, enhancer,
             )
+            try:
+                # Checkpoints are cleared with the manifest; the attempt counter
+                # exists even when no frames needed checkpointing
+                _checkpoint_store(storage, user_id, job_id).clear([ATTEMPTS_NAME])
+            except Exception as ckpt_err:
+                print(f"Warning: Failed to clear attempt counter: {ckpt_err}")
 
         return result
 
     except Exception as e:
         print(f"Error processing faceswap: {e}")
+        if is_video and not final_attempt and is_transient(e):
+            # Modal runs the job again in a new container, which resumes
+            # from the checkpoints; the job stays "processing" meanwhile
+            print(f"Attempt {attempt}/{FACESWAP_RETRIES + 1} failed transiently, retrying")
+            raise
         try:
             supabase.table("jobs").update({
                 "status": "failed",
@@ -757,15 +1059,19 @@ def process_faceswap(
             }).eq("id", job_id).execute()
         except Exception as status_err:
             print(f"CRITICAL: Failed to update job status: {status_err}")
-        raise
+        # Returned, not raised: Modal would retry a deterministic failure
+        return {"status": "failed", "error": str(e)[:500]}
 
     finally:
+        print(f"Storage transfers: {storage.metrics.summary()}")
+        print(f"Artifact cache: {artifacts.summary()}")
+        artifacts.commit()
         import shutil
         shutil.rmtree(work_dir, ignore_errors=True)
 
 
 def _process_faceswap_image(
-    supabase, job_id, source_path, ref_img,
+    supabase, storage, artifacts, job_id, source_path, ref_face,
     variant_count, swap_only, user_id, work_dir, output_dir,
     analyser, swapper, enhancer,
 ):
@@ -774,12 +1080,11 @@ def _process_faceswap_image(
     import sys
     sys.path.insert(0, "/helpers")
     from face_swapper import swap_face_in_image
+    from variant_executor import job_seed, variant_rng, variant_seed
 
     # Download source image
     print(f"Downloading source image: {source_path}")
-    src_bytes = supabase.storage.from_("images").download(source_path)
-    src_path = work_dir / "source.jpg"
-    src_path.write_bytes(src_bytes)
+    src_path = artifacts.fetch_to(storage, "images", source_path, work_dir / "source.jpg")
     source_img = cv2.imread(str(src_path))
 
     if source_img is None:
@@ -787,7 +1092,7 @@ def _process_faceswap_image(
 
     # Perform face swap
     print("Swapping face...")
-    swapped = swap_face_in_image(source_img, ref_img, analyser, swapper, enhancer)
+    swapped = swap_face_in_image(source_img, None, analyser, swapper, enhancer, ref_face=ref_face)
 
     if swapped is None:
         raise ValueError("No face detected in source image")
@@ -802,18 +1107,14 @@ def _process_faceswap_image(
         file_hash = calculate_file_hash(str(out_path))
 
         storage_path = f"{user_id}/{job_id}/faceswap_001.jpg"
-        with open(out_path, "rb") as f:
-            supabase.storage.from_("outputs").upload(
-                storage_path, f.read(), {"content-type": "image/jpeg"}
-            )
+        storage.upload_file("outputs", storage_path, out_path, "image/jpeg")
 
-        supabase.table("variants").insert({
-            "job_id": job_id,
+        save_variant_row(supabase, job_id, 0, {
             "file_path": storage_path,
             "file_size": file_size,
             "file_hash": file_hash,
             "transformations": {"type": "faceswap"},
-        }).execute()
+        })
 
         total_variants = 1
         variants = [{"name": "faceswap_001.jpg", "path": str(out_path)}]
@@ -826,29 +1127,31 @@ def _process_faceswap_image(
         actual_count = max(1, variant_count)
         variants = []
 
+        seed = job_seed(job_id)
         for i in range(actual_count):
             variant_name = f"faceswap_{i+1:03d}.jpg"
             variant_path = output_dir / variant_name
 
-            augmented = augment_image(swapped_pil.copy())
-            save_clean(augmented, variant_path)
+            rng = variant_rng(seed, i)
+            augmented = augment_image(swapped_pil, rng)
+            data = save_clean(augmented, variant_path, rng)
 
-            file_size = variant_path.stat().st_size
-            file_hash = calculate_file_hash(str(variant_path))
+            file_size = len(data)
+            file_hash = calculate_bytes_hash(data)
 
             storage_path = f"{user_id}/{job_id}/{variant_name}"
-            with open(variant_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    storage_path, f.read(), {"content-type": "image/jpeg"}
-                )
+            storage.upload("outputs", storage_path, data, "image/jpeg")
 
-            supabase.table("variants").insert({
-                "job_id": job_id,
+            save_variant_row(supabase, job_id, i, {
                 "file_path": storage_path,
                 "file_size": file_size,
                 "file_hash": file_hash,
-                "transformations": {"type": "faceswap_variant", "index": i + 1},
-            }).execute()
+                "transformations": {
+                    "type": "faceswap_variant",
+                    "index": i + 1,
+                    "seed": variant_seed(seed, i),
+                },
+            })
 
             variants.append({"name": variant_name, "path": str(variant_path)})
 
@@ -864,10 +1167,7 @@ def _process_faceswap_image(
     create_zip_archive(variants, str(zip_path))
 
     zip_storage = f"{user_id}/{job_id}/faceswap.zip"
-    with open(zip_path, "rb") as f:
-        supabase.storage.from_("outputs").upload(
-            zip_storage, f.read(), {"content-type": "application/zip"}
-        )
+    storage.upload_file("outputs", zip_storage, zip_path, "application/zip")
 
     supabase.table("jobs").update({
         "status": "completed",
@@ -880,71 +1180,171 @@ def _process_faceswap_image(
     return {"status": "completed", "variants_created": total_variants, "output_path": zip_storage}
 
 
-def _process_faceswap_video(
-    supabase, job_id, source_path, ref_img,
+def _process_faceswap_batch(
+    supabase, storage, artifacts, job_id, image_paths, ref_face,
     variant_count, swap_only, user_id, work_dir, output_dir,
     analyser, swapper, enhancer,
 ):
-    """Handle faceswap for a video (frame-by-frame)."""
+    """
+    Handle faceswap for many source images against one reference face.
+
+    Models and the reference embedding are shared; images are downloaded,
+    decoded and swapped on a thread pool (ONNX Runtime releases the GIL, the
+    stateful GFPGAN helper is serialised by a lock), and each result is
+    encoded and uploaded as it arrives. Images without a face are skipped;
+    the job fails only if none could be swapped.
+    """
     import cv2
     import sys
+    import numpy as np
     sys.path.insert(0, "/helpers")
     from face_swapper import swap_face_in_image
+    from variant_executor import job_seed, map_ordered, variant_rng, variant_seed
+
+    total_images = len(image_paths)
+    enhancer_lock = threading.Lock()
+
+    def swap_one(path: str):
+        src_bytes = artifacts.fetch(storage, "images", path)
+        source_img = cv2.imdecode(np.frombuffer(src_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if source_img is None:
+            print(f"Warning: Failed to read source image {path}")
+            return None
+        return swap_face_in_image(
+            source_img, None, analyser, swapper, enhancer,
+            ref_face=ref_face, enhancer_lock=enhancer_lock,
+        )
 
-    # Download source video
-    print(f"Downloading source video: {source_path}")
-    src_bytes = supabase.storage.from_("videos").download(source_path)
-    src_path = work_dir / "source.mp4"
-    src_path.write_bytes(src_bytes)
+    from image_augmenter import augment_image, save_clean
+    from PIL import Image as PILImage
+
+    per_image = 1 if swap_only else max(1, variant_count)
+    variants = []
+    seed = job_seed(job_id)
+
+    # Swaps run a bounded window ahead; each swapped image is encoded,
+    # uploaded and released before the next one is taken, so at most a
+    # window of full-resolution images is held at once
+    print(f"Swapping faces in {total_images} images...")
+    workers = min(FACESWAP_BATCH_WORKERS, total_images)
+    swapped_count = 0
+    for i, (path, swapped) in enumerate(map_ordered(swap_one, image_paths, max_workers=workers)):
+        if swapped is None:
+            print(f"Warning: No face detected in {path}, skipping")
+            update_job_status(supabase, job_id, "processing", int((i + 1) / total_images * 95), len(variants))
+            continue
+        swapped_count += 1
+
+        if swap_only:
+            variant_name = f"faceswap_{i+1:03d}.jpg"
+            variant_path = output_dir / variant_name
+            data = cv2.imencode(".jpg", swapped, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+            variant_path.write_bytes(data)
+            outputs = [(i, variant_name, variant_path, data, {"type": "faceswap", "image": i + 1})]
+        else:
+            swapped_pil = PILImage.fromarray(cv2.cvtColor(swapped, cv2.COLOR_BGR2RGB))
+            outputs = []
+            for j in range(per_image):
+                variant_name = f"faceswap_{i+1:03d}_{j+1:02d}.jpg"
+                variant_path = output_dir / variant_name
+                index = i * per_image + j
+                rng = variant_rng(seed, index)
+                data = save_clean(augment_image(swapped_pil, rng), variant_path, rng)
+                outputs.append((index, variant_name, variant_path, data, {
+                    "type": "faceswap_variant", "image": i + 1, "index": j + 1,
+                    "seed": variant_seed(seed, index),
+                }))
+            del swapped_pil
+        del swapped
+
+        for index, variant_name, variant_path, data, transformations in outputs:
+            file_size = len(data)
+            file_hash = calculate_bytes_hash(data)
+
+            storage_path = f"{user_id}/{job_id}/{variant_name}"
+            try:
+                storage.upload("outputs", storage_path, data, "image/jpeg")
+            except Exception as upload_err:
+                print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
 
-    # Extract frames
-    frames_dir = work_dir / "frames"
-    frames_dir.mkdir(exist_ok=True)
-    swapped_frames_dir = work_dir / "swapped_frames"
-    swapped_frames_dir.mkdir(exist_ok=True)
+            try:
+                save_variant_row(supabase, job_id, index, {
+                    "file_path": storage_path,
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                    "transformations": {**transformations, "source_path": path},
+                })
+            except Exception as db_err:
+                print(f"Warning: Failed to insert variant record {variant_name}: {db_err}")
 
-    print("Extracting frames...")
-    cmd = [
-        "ffmpeg", "-y", "-i", str(src_path),
-        "-qscale:v", "2",
-        str(frames_dir / "frame_%06d.png"),
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"FFmpeg frame extraction failed: {result.stderr}")
+            variants.append({"name": variant_name, "path": str(variant_path)})
+        del outputs
 
-    frame_files = sorted(frames_dir.glob("frame_*.png"))
-    total_frames = len(frame_files)
-    print(f"Extracted {total_frames} frames")
+        update_job_status(supabase, job_id, "processing", int((i + 1) / total_images * 95), len(variants))
+        print(f"  Image {i+1}/{total_images} swapped ({len(variants)} outputs)")
 
-    if total_frames == 0:
-        raise ValueError("No frames extracted from video")
+    if swapped_count == 0:
+        raise ValueError("No face detected in any source image")
 
-    update_job_status(supabase, job_id, "processing", 10)
+    total_variants = len(variants)
 
-    # Swap face in each frame
-    print("Swapping faces frame-by-frame...")
-    for i, frame_path in enumerate(frame_files):
-        frame = cv2.imread(str(frame_path))
-        swapped = swap_face_in_image(frame, ref_img, analyser, swapper, enhancer)
+    # Create ZIP
+    print("Creating ZIP archive...")
+    zip_path = work_dir / f"{job_id}_faceswap.zip"
+    create_zip_archive(variants, str(zip_path))
 
-        out_frame_path = swapped_frames_dir / frame_path.name
-        if swapped is not None:
-            cv2.imwrite(str(out_frame_path), swapped)
-        else:
-            # No face in this frame — keep original
-            cv2.imwrite(str(out_frame_path), frame)
+    zip_storage = f"{user_id}/{job_id}/faceswap.zip"
+    storage.upload_file("outputs", zip_storage, zip_path, "application/zip")
+
+    supabase.table("jobs").update({
+        "status": "completed",
+        "progress": 100,
+        "variants_completed": total_variants,
+        "output_zip_path": zip_storage,
+        "completed_at": datetime.utcnow().isoformat(),
+    }).eq("id", job_id).execute()
+
+    return {"status": "completed", "variants_created": total_variants, "output_path": zip_storage}
+
+
+def _process_faceswap_video(
+    supabase, storage, artifacts, job_id, source_path, face_path, ref_face,
+    variant_count, swap_only, user_id, work_dir, output_dir,
+    analyser, swapper, enhancer,
+):
+    """
+    Handle faceswap for a video (frame-by-frame).
 
-        if (i + 1) % 30 == 0 or i == total_frames - 1:
-            progress = 10 + int((i + 1) / total_frames * 60)
-            update_job_status(supabase, job_id, "processing", progress)
-            print(f"  Frame {i+1}/{total_frames}")
+    Swapped frames are encoded in segments of CHECKPOINT_FRAMES that are
+    checkpointed with a manifest; a retried job resumes after the last one.
+    """
+    import cv2
+    import sys
+    sys.path.insert(0, "/helpers")
+    from face_swapper import scan_face_presence, swap_face_in_image
+    from checkpoints import load_manifest, save_segment, segment_names
+    from artifact_cache import content_key
+    from variant_executor import job_seed, variant_seed
+    from ffmpeg_utils import TempoTracks, audio_codec
 
-    # Get original video FPS and audio info
-    video_info = get_video_info(str(src_path))
+    # Download source video
+    print(f"Downloading source video: {source_path}")
+    src_path = artifacts.fetch_to(storage, "videos", source_path, work_dir / "source.mp4")
+
+    # Get original video FPS and resolution (cached per source version)
+    source_key = artifacts.object_key(storage, "videos", source_path)
+    video_info = artifacts.memo_json(
+        "probe",
+        source_key and content_key(source_key, "probe-v1"),
+        lambda: get_video_info(str(src_path)),
+    )
     fps = "30"
+    width = height = None
+    source_audio_codec = audio_codec(video_info)
     for stream in video_info.get("streams", []):
         if stream.get("codec_type") == "video":
+            width = stream.get("width")
+            height = stream.get("height")
             r_frame_rate = stream.get("r_frame_rate", "30/1")
             if "/" in r_frame_rate:
                 num, den = r_frame_rate.split("/")
@@ -953,26 +1353,152 @@ def _process_faceswap_video(
                 fps = r_frame_rate
             break
 
-    # Reassemble video from swapped frames + original audio
-    print("Reassembling video...")
+    # Low-resolution pre-scan: find which frames can contain a face at all
+    presence = []
+    if width and height:
+        print("Pre-scanning for faces...")
+        presence = scan_face_presence(str(src_path), analyser, width, height)
+        print(f"Faces present in {sum(presence)}/{len(presence)} frames")
+
     swapped_video = work_dir / "swapped.mp4"
-    cmd = [
-        "ffmpeg", "-y",
-        "-framerate", fps,
-        "-i", str(swapped_frames_dir / "frame_%06d.png"),
-        "-i", str(src_path),
-        "-map", "0:v",
-        "-map", "1:a?",
-        "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-        "-c:a", "aac", "-b:a", "128k",
-        "-pix_fmt", "yuv420p",
-        "-map_metadata", "-1",
-        "-fflags", "+bitexact",
-        str(swapped_video),
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"FFmpeg reassembly failed: {result.stderr}")
+    store = None
+    manifest = None
+
+    if presence and not any(presence):
+        # Nothing to swap anywhere: the source passes through unchanged,
+        # no frames are extracted, swapped or re-encoded
+        print("No faces found, using source video as-is")
+        video_input = ["-i", str(src_path)]
+
+        if swap_only:
+            # Stream-copy the source instead of re-encoding it
+            cmd = [
+                "ffmpeg", "-y", "-i", str(src_path),
+                "-map", "0:v:0", "-map", "0:a?",
+                "-c", "copy",
+                "-map_metadata", "-1",
+                "-fflags", "+bitexact",
+                str(swapped_video),
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"FFmpeg stream copy failed: {result.stderr}")
+    else:
+        # Extract frames
+        frames_dir = work_dir / "frames"
+        frames_dir.mkdir(exist_ok=True)
+        swapped_frames_dir = work_dir / "swapped_frames"
+        swapped_frames_dir.mkdir(exist_ok=True)
+
+        print("Extracting frames...")
+        cmd = [
+            "ffmpeg", "-y", "-i", str(src_path),
+            "-qscale:v", "2",
+            str(frames_dir / "frame_%06d.png"),
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg frame extraction failed: {result.stderr}")
+
+        frame_files = sorted(frames_dir.glob("frame_*.png"))
+        total_frames = len(frame_files)
+        print(f"Extracted {total_frames} frames")
+
+        if total_frames == 0:
+            raise ValueError("No frames extracted from video")
+
+        if len(presence) != total_frames:
+            # Timeline doesn't line up with the extracted frames: swap everything
+            print(f"Warning: pre-scan covered {len(presence)}/{total_frames} frames, ignoring it")
+            presence = [True] * total_frames
+
+        # Resume after the last segment a previous attempt checkpointed
+        store = _checkpoint_store(storage, user_id, job_id)
+        manifest = load_manifest(
+            store,
+            source_path=source_path,
+            face_path=face_path,
+            total_frames=total_frames,
+            segment_frames=CHECKPOINT_FRAMES,
+            fps=fps,
+        )
+        segments_dir = work_dir / "segments"
+        segments_dir.mkdir(exist_ok=True)
+        segment_paths = _restore_segments(store, manifest, segments_dir)
+        resume_frame = sum(seg["frames"] for seg in manifest["segments"])
+        if resume_frame:
+            print(f"Resuming from frame {resume_frame + 1}/{total_frames} "
+                  f"({len(segment_paths)} checkpointed segments)")
+            if not swap_only:
+                # Variants are encoded from the frame sequence, so frames
+                # swapped by a previous attempt come back from their segments
+                for segment, segment_path in zip(manifest["segments"], segment_paths):
+                    _decode_segment_frames(segment_path, segment["start"], swapped_frames_dir)
+
+        update_job_status(supabase, job_id, "processing", 10 + int(resume_frame / total_frames * 60))
+
+        # Swap face in each frame; face-free frames bypass the models entirely
+        print("Swapping faces frame-by-frame...")
+        skipped = 0
+        checkpointing = True
+        segment_start = resume_frame
+        for i in range(resume_frame, total_frames):
+            frame_path = frame_files[i]
+            out_frame_path = swapped_frames_dir / frame_path.name
+
+            if not presence[i]:
+                # No face in this frame — move the original, no decode/encode
+                frame_path.replace(out_frame_path)
+                skipped += 1
+            else:
+                frame = cv2.imread(str(frame_path))
+                swapped = swap_face_in_image(frame, None, analyser, swapper, enhancer, ref_face=ref_face)
+
+                if swapped is not None:
+                    cv2.imwrite(str(out_frame_path), swapped)
+                else:
+                    # Detector missed at full resolution — keep original
+                    frame_path.replace(out_frame_path)
+
+            # Encode and checkpoint every CHECKPOINT_FRAMES frames
+            if i + 1 - segment_start == CHECKPOINT_FRAMES or i == total_frames - 1:
+                index = len(segment_paths)
+                segment = {
+                    "index": index,
+                    "start": segment_start,
+                    "frames": i + 1 - segment_start,
+                    "name": f"segment_{index:04d}.mp4",
+                }
+                segment_path = segments_dir / segment["name"]
+                _encode_segment(swapped_frames_dir, fps, segment["start"], segment["frames"], segment_path)
+                segment_paths.append(segment_path)
+
+                if checkpointing:
+                    try:
+                        save_segment(store, manifest, segment, segment_path)
+                    except Exception as ckpt_err:
+                        # Later segments would leave a gap in the manifest
+                        print(f"Warning: Failed to checkpoint {segment['name']}, "
+                              f"checkpointing disabled: {ckpt_err}")
+                        checkpointing = False
+                segment_start = i + 1
+
+            if (i + 1) % 30 == 0 or i == total_frames - 1:
+                progress = 10 + int((i + 1) / total_frames * 60)
+                update_job_status(supabase, job_id, "processing", progress)
+                print(f"  Frame {i+1}/{total_frames}")
+
+        print(f"Skipped models on {skipped}/{total_frames - resume_frame} face-free frames")
+
+        if swap_only:
+            # Reassemble video from encoded segments + original audio
+            print("Reassembling video...")
+            _concat_segments(segment_paths, src_path, swapped_video, source_audio_codec)
+
+        video_input = [
+            "-framerate", fps,
+            "-i", str(swapped_frames_dir / "frame_%06d.png"),
+        ]
 
     update_job_status(supabase, job_id, "processing", 75)
 
@@ -987,23 +1513,19 @@ def _process_faceswap_video(
         file_hash = calculate_file_hash(str(final_path))
 
         storage_path = f"{user_id}/{job_id}/{final_name}"
-        with open(final_path, "rb") as f:
-            supabase.storage.from_("outputs").upload(
-                storage_path, f.read(), {"content-type": "video/mp4"}
-            )
+        storage.upload_file("outputs", storage_path, final_path, "video/mp4")
 
-        supabase.table("variants").insert({
-            "job_id": job_id,
+        save_variant_row(supabase, job_id, 0, {
             "file_path": storage_path,
             "file_size": file_size,
             "file_hash": file_hash,
             "transformations": {"type": "faceswap"},
-        }).execute()
+        })
 
         total_variants = 1
         variants = [{"name": final_name, "path": str(final_path)}]
     else:
-        # Generate FFmpeg variants from the swapped video
+        # Generate FFmpeg variants from the swapped frames
         actual_count = max(1, variant_count)
         variants = []
         default_settings = {
@@ -1014,35 +1536,63 @@ def _process_faceswap_video(
             "speed_range": [0.98, 1.02],
         }
 
+        variant_specs = []
+        seed = job_seed(job_id)
         for i in range(actual_count):
             variant_name = f"faceswap_{i+1:03d}.mp4"
-            variant_path = output_dir / variant_name
+            vseed = variant_seed(seed, i)
+            transformations = generate_transformations(default_settings, random.Random(vseed))
+            transformations["seed"] = vseed
+            variant_specs.append((variant_name, transformations))
+
+        # Every variant's audio is made in one pass up front and
+        # stream-copied by the encoders
+        tempo_tracks = None
+        if source_audio_codec:
+            tempo_tracks = TempoTracks(src_path, source_audio_codec, work_dir / "audio")
+            tempo_tracks.prepare(t["speed"] for _, t in variant_specs)
+
+        # Swapped frames feed the variant encoders directly: one decode per
+        # batch of outputs, no intermediate swapped.mp4
+        for batch_start in range(0, actual_count, FUSED_VARIANTS_PER_PASS):
+            batch = variant_specs[batch_start:batch_start + FUSED_VARIANTS_PER_PASS]
+            print(f"Encoding variants {batch_start + 1}-{batch_start + len(batch)}/{actual_count}...")
+            process_variants_fused(
+                video_input,
+                tempo_tracks,
+                [(str(output_dir / name), t) for name, t in batch],
+            )
 
-            transformations = generate_transformations(default_settings)
-            process_single_variant(str(swapped_video), str(variant_path), transformations)
+            # Upload the batch's outputs concurrently
+            errors = storage.upload_many("outputs", [
+                (f"{user_id}/{job_id}/{name}", output_dir / name, "video/mp4")
+                for name, _ in batch
+            ])
+            for err in errors:
+                if err is not None:
+                    raise err
+
+            for j, (variant_name, transformations) in enumerate(batch):
+                i = batch_start + j
+                variant_path = output_dir / variant_name
 
-            file_size = variant_path.stat().st_size
-            file_hash = calculate_file_hash(str(variant_path))
+                file_size = variant_path.stat().st_size
+                file_hash = calculate_file_hash(str(variant_path))
 
-            storage_path = f"{user_id}/{job_id}/{variant_name}"
-            with open(variant_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    storage_path, f.read(), {"content-type": "video/mp4"}
-                )
+                storage_path = f"{user_id}/{job_id}/{variant_name}"
 
-            supabase.table("variants").insert({
-                "job_id": job_id,
-                "file_path": storage_path,
-                "file_size": file_size,
-                "file_hash": file_hash,
-                "transformations": {**transformations, "type": "faceswap_variant"},
-            }).execute()
+                save_variant_row(supabase, job_id, i, {
+                    "file_path": storage_path,
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                    "transformations": {**transformations, "type": "faceswap_variant"},
+                })
 
-            variants.append({"name": variant_name, "path": str(variant_path)})
+                variants.append({"name": variant_name, "path": str(variant_path)})
 
-            progress = 75 + int((i + 1) / actual_count * 20)
-            update_job_status(supabase, job_id, "processing", progress, i + 1)
-            print(f"Variant {i+1}/{actual_count} complete")
+                progress = 75 + int((i + 1) / actual_count * 20)
+                update_job_status(supabase, job_id, "processing", progress, i + 1)
+                print(f"Variant {i+1}/{actual_count} complete")
 
         total_variants = actual_count
 
@@ -1052,10 +1602,7 @@ def _process_faceswap_video(
     create_zip_archive(variants, str(zip_path))
 
     zip_storage = f"{user_id}/{job_id}/faceswap.zip"
-    with open(zip_path, "rb") as f:
-        supabase.storage.from_("outputs").upload(
-            zip_storage, f.read(), {"content-type": "application/zip"}
-        )
+    storage.upload_file("outputs", zip_storage, zip_path, "application/zip")
 
     supabase.table("jobs").update({
         "status": "completed",
@@ -1065,59 +1612,112 @@ def _process_faceswap_video(
         "completed_at": datetime.utcnow().isoformat(),
     }).eq("id", job_id).execute()
 
+    if store is not None:
+        try:
+            store.clear(segment_names(manifest))
+        except Exception as ckpt_err:
+            print(f"Warning: Failed to remove checkpoints: {ckpt_err}")
+
     return {"status": "completed", "variants_created": total_variants, "output_path": zip_storage}
 
 
-def _generate_slideshow(
-    image_paths: List[Path],
-    output_path: Path,
-    pause: float = 2.0,
-    scroll: float = 0.2,
-    crf: int = 18,
-    fps: int = 30,
-) -> None:
-    """Generate a slideshow video from captioned images using FFmpeg xfade transitions."""
-    n = len(image_paths)
-    if n < 2:
-        return
+def _checkpoint_store(storage, user_id: str, job_id: str):
+    """Segment checkpoint store: the job's storage backend, or CHECKPOINT_DIR when set."""
+    from checkpoints import LocalCheckpointStore, StorageCheckpointStore
 
-    cmd = ["ffmpeg", "-y"]
+    local_dir = os.environ.get("CHECKPOINT_DIR")
+    if local_dir:
+        return LocalCheckpointStore(Path(local_dir) / job_id)
+    return StorageCheckpointStore(storage, "outputs", f"{user_id}/{job_id}/checkpoints")
 
-    slide_duration = pause + scroll
-    for img_path in image_paths:
-        cmd += ["-loop", "1", "-t", str(slide_duration), "-i", str(img_path)]
 
-    filter_parts = []
-    current_input = "[0:v]"
+def _restore_segments(store, manifest: Dict[str, Any], segments_dir: Path) -> List[Path]:
+    """
+    Download the segments listed in manifest into segments_dir.
 
-    for i in range(1, n):
-        next_input = f"[{i}:v]"
-        offset = pause + (i - 1) * (pause + scroll)
+    Stops at the first segment that can't be fetched and truncates the
+    manifest there, so the frame loop resumes right after the last good one.
+    """
+    paths = []
+    for i, segment in enumerate(manifest["segments"]):
+        data = store.read(segment["name"])
+        if not data:
+            print(f"Warning: Checkpoint {segment['name']} missing, resuming before it")
+            manifest["segments"] = manifest["segments"][:i]
+            break
+        path = segments_dir / segment["name"]
+        path.write_bytes(data)
+        paths.append(path)
+    return paths
 
-        if i < n - 1:
-            out_label = f"[v{i}]"
-        else:
-            out_label = "[outv]"
 
-        filter_parts.append(
-            f"{current_input}{next_input}xfade=transition=slideleft:duration={scroll}:offset={offset:.4f}{out_label}"
-        )
-        current_input = out_label
+def _encode_segment(frames_dir: Path, fps: str, start: int, count: int, output_path: Path) -> None:
+    """Encode frames [start, start + count) of the swapped sequence (0-based)."""
+    cmd = [
+        "ffmpeg", "-y",
+        "-framerate", fps,
+        "-start_number", str(start + 1),  # frame files are 1-based
+        "-i", str(frames_dir / "frame_%06d.png"),
+        "-frames:v", str(count),
+        "-c:v", "libx264", "-preset", "fast", "-crf", "23",
+        "-pix_fmt", "yuv420p",
+        "-map_metadata", "-1",
+        "-fflags", "+bitexact",
+        str(output_path),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg segment encode failed: {result.stderr}")
 
-    filter_complex = ";".join(filter_parts)
 
-    cmd += [
-        "-filter_complex", filter_complex,
-        "-map", "[outv]",
-        "-c:v", "libx264", "-pix_fmt", "yuv420p",
-        "-r", str(fps), "-crf", str(crf),
-        "-map_metadata", "-1", "-fflags", "+bitexact",
-        str(output_path),
+def _decode_segment_frames(segment_path: Path, start: int, frames_dir: Path) -> None:
+    """Decode a checkpointed segment back into frames_dir at its frame offset."""
+    cmd = [
+        "ffmpeg", "-y", "-i", str(segment_path),
+        "-start_number", str(start + 1),  # frame files are 1-based
+        str(frames_dir / "frame_%06d.png"),
     ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg segment decode failed: {result.stderr}")
+
 
+def _concat_segments(
+    segment_paths: List[Path],
+    audio_source: Path,
+    output_path: Path,
+    audio_codec: Optional[str] = None,
+) -> None:
+    """Stream-copy encoded segments into one video and mux the source audio.
+
+    The audio is copied too when its codec fits MP4, else encoded to AAC.
+    """
+    from ffmpeg_utils import MP4_AUDIO_CODECS
+
+    if audio_codec in MP4_AUDIO_CODECS:
+        audio_args = ["-c:a", "copy"]
+    else:
+        audio_args = ["-c:a", "aac", "-b:a", "128k"]
+
+    concat_list = output_path.with_suffix(".txt")
+    concat_list.write_text("".join(f"file '{p}'\n" for p in segment_paths))
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", str(concat_list),
+        "-i", str(audio_source),
+        "-map", "0:v",
+        "-map", "1:a?",
+        "-c:v", "copy",
+        *audio_args,
+        "-map_metadata", "-1",
+        "-fflags", "+bitexact",
+        str(output_path),
+    ]
     result = subprocess.run(cmd, capture_output=True, text=True)
+    concat_list.unlink(missing_ok=True)
     if result.returncode != 0:
-        print(f"Warning: Slideshow generation failed: {result.stderr[-300:]}")
+        raise RuntimeError(f"FFmpeg reassembly failed: {result.stderr}")
 
 
 @app.function(image=image)
@@ -1158,6 +1758,7 @@ def start_caption_processing(item: dict):
 
 @app.function(
     image=image,
+    volumes={ARTIFACT_CACHE_PATH: artifact_volume},
     timeout=600,
     cpu=2,
     memory=4096,
@@ -1169,21 +1770,35 @@ def process_image(
     user_id: str,
     supabase_url: str,
     supabase_key: str,
+    augment_mode: str = "pixel",
+    min_phash_distance: float = 0,
 ) -> Dict[str, Any]:
     """
     Process a photo to create unique variants via light augmentation.
 
     Downloads from 'images' bucket, applies brightness/saturation/tint
     augmentations, saves with randomized JPEG quality and stripped metadata.
+
+    augment_mode="jpeg" uses the lighter JPEG-native path instead (YCbCr
+    offsets, source quantization tables) for JPEG sources.
+
+    Variants closer than min_phash_distance bits (perceptual hash) to the
+    source or an earlier variant are regenerated.
     """
     from supabase import create_client, Client
     from PIL import Image
     import sys
 
     sys.path.insert(0, "/helpers")
-    from image_augmenter import augment_image, save_clean
+    from storage import open_storage
+    from artifact_cache import content_key, open_artifact_cache
+    from image_augmenter import augment_image, encode_clean, load_jpeg_source, uniquify_jpeg
+    from variant_executor import job_seed, map_ordered, variant_rng, variant_seed
+    from perceptual_hash import UniquenessIndex, fingerprint_bytes
 
     supabase: Client = create_client(supabase_url, supabase_key)
+    storage = open_storage(supabase_url, supabase_key)
+    artifacts = open_artifact_cache(artifact_volume, ARTIFACT_CACHE_PATH)
 
     work_dir = Path(f"/tmp/{job_id}")
     work_dir.mkdir(parents=True, exist_ok=True)
@@ -1195,25 +1810,50 @@ def process_image(
 
         # Download source photo from images bucket
         print(f"Downloading source photo: {source_path}")
-        response = supabase.storage.from_("images").download(source_path)
+        response = artifacts.fetch(storage, "images", source_path)
         input_path = work_dir / "input.jpg"
         input_path.write_bytes(response)
 
-        base_img = Image.open(input_path).convert("RGB")
+        jpeg_source = load_jpeg_source(response) if augment_mode == "jpeg" else None
+        if augment_mode == "jpeg" and jpeg_source is None:
+            print("Source is not a YCbCr JPEG, using pixel augmentation")
+        base_img = None if jpeg_source else Image.open(input_path).convert("RGB")
 
-        variants = []
-        for i in range(variant_count):
-            variant_name = f"variant_{i+1:03d}.jpg"
-            variant_path = output_dir / variant_name
+        seed = job_seed(job_id)
+        source_key = artifacts.object_key(storage, "images", source_path)
+        mode = "jpeg" if jpeg_source else "pixel"
+        uniqueness_index = UniquenessIndex(fingerprint_bytes(response), min_phash_distance)
 
-            # Apply light augmentation
-            augmented = augment_image(base_img.copy())
+        def render_variant(i: int, attempt: int = 0) -> Tuple[bytes, str, Any, int]:
+            vseed = variant_seed(seed, i, attempt)
 
-            # Save with metadata stripped
-            save_clean(augmented, variant_path)
+            def encode() -> bytes:
+                # Light augmentation, then encode with metadata stripped
+                rng = variant_rng(seed, i, attempt)
+                if jpeg_source:
+                    return uniquify_jpeg(jpeg_source, rng)
+                return encode_clean(augment_image(base_img, rng), rng)
 
-            file_size = variant_path.stat().st_size
-            file_hash = calculate_file_hash(str(variant_path))
+            result_key = source_key and content_key(
+                source_key, "photo_clean", mode, vseed, RESULT_VERSION
+            )
+            data = artifacts.memo_bytes("result", result_key, encode)
+            (output_dir / f"variant_{i+1:03d}.jpg").write_bytes(data)
+            return data, calculate_bytes_hash(data), fingerprint_bytes(data), vseed
+
+        # Variants are rendered (and fingerprinted) in parallel; uniqueness
+        # checks, uploads, records and progress are handled here in order
+        variants = []
+        for i, first in map_ordered(render_variant, range(variant_count)):
+            (data, file_hash, _, vseed), uniqueness = uniqueness_index.accept(
+                lambda attempt: render_variant(i, attempt),
+                lambda result: result[2],
+                MAX_REGENERATIONS,
+                first=first,
+            )
+            variant_name = f"variant_{i+1:03d}.jpg"
+            variant_path = output_dir / variant_name
+            file_size = len(data)
 
             variants.append({
                 "name": variant_name,
@@ -1225,12 +1865,7 @@ def process_image(
             # Upload variant to Supabase Storage
             variant_storage_path = f"{user_id}/{job_id}/{variant_name}"
             try:
-                with open(variant_path, "rb") as vf:
-                    supabase.storage.from_("outputs").upload(
-                        variant_storage_path,
-                        vf.read(),
-                        {"content-type": "image/jpeg"},
-                    )
+                storage.upload("outputs", variant_storage_path, data, "image/jpeg")
             except Exception as upload_err:
                 print(f"Warning: Failed to upload variant {variant_name}: {upload_err}")
 
@@ -1241,7 +1876,13 @@ def process_image(
                     "file_path": variant_storage_path,
                     "file_size": file_size,
                     "file_hash": file_hash,
-                    "transformations": {"type": "photo_clean", "index": i + 1},
+                    "transformations": {
+                        "type": "photo_clean",
+                        "index": i + 1,
+                        "augment_mode": mode,
+                        "seed": vseed,
+                        "uniqueness": uniqueness,
+                    },
                 }).execute()
             except Exception as db_err:
                 print(f"Warning: Failed to insert variant record {variant_name}: {db_err}")
@@ -1250,6 +1891,8 @@ def process_image(
             update_job_status(supabase, job_id, "processing", progress, i + 1)
             print(f"Image variant {i+1}/{variant_count} complete")
 
+        print(f"Perceptual uniqueness: {uniqueness_index.summary()}")
+
         # Create ZIP archive
         print("Creating ZIP archive...")
         zip_path = work_dir / f"{job_id}_variants.zip"
@@ -1257,12 +1900,7 @@ def process_image(
 
         output_zip_storage = f"{user_id}/{job_id}/variants.zip"
         try:
-            with open(zip_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    output_zip_storage,
-                    f.read(),
-                    {"content-type": "application/zip"},
-                )
+            storage.upload_file("outputs", output_zip_storage, zip_path, "application/zip")
         except Exception as zip_err:
             print(f"Warning: Failed to upload ZIP: {zip_err}")
             output_zip_storage = None
@@ -1295,6 +1933,9 @@ def process_image(
         raise
 
     finally:
+        print(f"Storage transfers: {storage.metrics.summary()}")
+        print(f"Artifact cache: {artifacts.summary()}")
+        artifacts.commit()
         import shutil
         shutil.rmtree(work_dir, ignore_errors=True)
 
@@ -1322,6 +1963,8 @@ def start_image_processing(item: dict):
         user_id=item["user_id"],
         supabase_url=item["supabase_url"],
         supabase_key=item["supabase_key"],
+        augment_mode=item.get("augment_mode", "pixel"),
+        min_phash_distance=item.get("min_phash_distance", 0),
     )
 
     return {"status": "queued", "call_id": call.object_id}
@@ -1333,6 +1976,7 @@ def start_image_processing(item: dict):
 
 @app.function(
     image=image,
+    volumes={ARTIFACT_CACHE_PATH: artifact_volume},
     timeout=600,
     cpu=2,
     memory=4096,
@@ -1344,6 +1988,8 @@ def process_multiply(
     user_id: str,
     supabase_url: str,
     supabase_key: str,
+    augment_mode: str = "pixel",
+    min_phash_distance: float = 0,
 ) -> Dict[str, Any]:
     """
     Create N unique copies of an entire caption carousel.
@@ -1353,20 +1999,36 @@ def process_multiply(
     is safe to post on a different account without duplicate detection.
 
     Output: N separate carousel folders in a ZIP.
+
+    augment_mode="jpeg" uses the lighter JPEG-native path (YCbCr offsets,
+    source quantization tables) for every slide that is a JPEG.
+
+    Each copy of a slide closer than min_phash_distance bits (perceptual
+    hash) to its source slide or an earlier copy is regenerated.
     """
     from supabase import create_client, Client
     from PIL import Image
     import sys
 
     sys.path.insert(0, "/helpers")
-    from image_augmenter import augment_image, save_clean
+    from storage import open_storage
+    from artifact_cache import content_key, open_artifact_cache
+    from image_augmenter import (
+        JpegSource, augment_image, encode_clean, load_jpeg_source, uniquify_jpeg,
+    )
+    from variant_executor import job_seed, map_ordered, variant_rng, variant_seed
+    from source_cache import SourceImageCache
+    from perceptual_hash import UniquenessIndex, fingerprint_bytes, from_hex, to_hex
 
     supabase: Client = create_client(supabase_url, supabase_key)
+    storage = open_storage(supabase_url, supabase_key)
+    artifacts = open_artifact_cache(artifact_volume, ARTIFACT_CACHE_PATH)
 
     work_dir = Path(f"/tmp/{job_id}")
     work_dir.mkdir(parents=True, exist_ok=True)
     output_dir = work_dir / "variants"
     output_dir.mkdir(exist_ok=True)
+    source_cache = None
 
     try:
         update_job_status(supabase, job_id, "processing", 0)
@@ -1382,76 +2044,142 @@ def process_multiply(
         if slide_count == 0:
             raise ValueError("Parent job has no output slides")
 
-        # Download all source slides from outputs bucket
-        print(f"Downloading {slide_count} source slides...")
-        source_images = []
-        for sv in source_variants:
-            file_path = sv["file_path"]
-            img_bytes = supabase.storage.from_("outputs").download(file_path)
-            tmp_path = work_dir / f"source_{len(source_images)}.jpg"
-            tmp_path.write_bytes(img_bytes)
-            img = Image.open(tmp_path).convert("RGB")
-            source_images.append(img)
+        slide_paths = [sv["file_path"] for sv in source_variants]
+
+        def fetch_slide(file_path: str) -> bytes:
+            img_bytes = artifacts.fetch(storage, "outputs", file_path)
             print(f"  Downloaded slide: {file_path}")
+            return img_bytes
+
+        def decode_slide(img_bytes: bytes):
+            # JpegSource in "jpeg" mode (when the slide is a YCbCr JPEG),
+            # otherwise a decoded RGB image for the pixel path
+            jpeg_source = load_jpeg_source(img_bytes) if augment_mode == "jpeg" else None
+            return jpeg_source or Image.open(io.BytesIO(img_bytes)).convert("RGB")
+
+        # Source slides are downloaded on demand (a few ahead) and kept under
+        # a byte budget; evicted slides are re-decoded from cached bytes
+        print(f"Fetching {slide_count} source slides...")
+        source_cache = SourceImageCache(fetch_slide, decode_slide)
+        source_cache.prefetch(slide_paths[:SOURCE_PREFETCH])
 
         total_items = slide_count * copy_count
         completed = 0
         all_variants = []
 
-        # For each copy set, augment every slide
+        seed = job_seed(job_id)
         for s in range(1, copy_count + 1):
-            set_dir = output_dir / f"set_{s:02d}"
-            set_dir.mkdir(exist_ok=True)
+            (output_dir / f"set_{s:02d}").mkdir(exist_ok=True)
 
-            for m in range(1, slide_count + 1):
-                slide_name = f"slide_{m:03d}.jpg"
-                slide_path = set_dir / slide_name
+        def slide_index(s: int, m: int) -> int:
+            return (s - 1) * slide_count + (m - 1)
 
-                # Apply light augmentation to a copy of the source
-                augmented = augment_image(source_images[m - 1].copy())
-                save_clean(augmented, slide_path)
+        def render_slide(item: Tuple[int, int], attempt: int = 0) -> Tuple[bytes, str, str, Any, int]:
+            # Light augmentation (source image is not modified); each
+            # (set, slide) pair gets its own seeded RNG
+            s, m = item
+            vseed = variant_seed(seed, slide_index(s, m), attempt)
+            used = {}
 
-                file_size = slide_path.stat().st_size
-                file_hash = calculate_file_hash(str(slide_path))
+            def encode() -> bytes:
+                source_cache.prefetch(
+                    slide_paths[(m + k) % slide_count] for k in range(SOURCE_PREFETCH)
+                )
+                source = source_cache.get(slide_paths[m - 1])
+                rng = variant_rng(seed, slide_index(s, m), attempt)
+                if isinstance(source, JpegSource):
+                    used["mode"] = "jpeg"
+                    return uniquify_jpeg(source, rng)
+                used["mode"] = "pixel"
+                return encode_clean(augment_image(source, rng), rng)
+
+            # The slide is only downloaded when no cached result exists; the
+            # mode actually used (non-JPEG slides fall back to pixel) is
+            # cached alongside it
+            source_key = artifacts.object_key(storage, "outputs", slide_paths[m - 1])
+            result_key = source_key and content_key(
+                source_key, "multiply", augment_mode, vseed, RESULT_VERSION
+            )
+            data = artifacts.memo_bytes("result", result_key, encode)
+            mode = artifacts.memo_json(
+                "result",
+                result_key and content_key(result_key, "mode"),
+                lambda: used.get("mode", augment_mode),
+            )
+            (output_dir / f"set_{s:02d}" / f"slide_{m:03d}.jpg").write_bytes(data)
+            return data, calculate_bytes_hash(data), mode, fingerprint_bytes(data), vseed
+
+        # Copies of a slide are checked against the source slide and each
+        # other (source fingerprints are cached with the source version)
+        uniqueness_indexes: Dict[int, Any] = {}
+
+        def slide_uniqueness(m: int):
+            if m not in uniqueness_indexes:
+                path = slide_paths[m - 1]
+                source_key = artifacts.object_key(storage, "outputs", path)
+                source_fp = artifacts.memo_json(
+                    "fingerprint",
+                    source_key and content_key(source_key, "phash-v1"),
+                    lambda: to_hex(fingerprint_bytes(source_cache.get_bytes(path))),
+                )
+                uniqueness_indexes[m] = UniquenessIndex(from_hex(source_fp), min_phash_distance)
+            return uniqueness_indexes[m]
+
+        # For each copy set, augment every slide. Slides are rendered (and
+        # fingerprinted) in parallel; uniqueness checks, uploads, records and
+        # progress are handled here in order.
+        items = [(s, m) for s in range(1, copy_count + 1) for m in range(1, slide_count + 1)]
+        for (s, m), first in map_ordered(render_slide, items):
+            (data, file_hash, mode, _, vseed), uniqueness = slide_uniqueness(m).accept(
+                lambda attempt: render_slide((s, m), attempt),
+                lambda result: result[3],
+                MAX_REGENERATIONS,
+                first=first,
+            )
+            slide_name = f"slide_{m:03d}.jpg"
+            slide_path = output_dir / f"set_{s:02d}" / slide_name
+            file_size = len(data)
 
-                # Upload to outputs bucket
-                storage_path = f"{user_id}/{job_id}/set_{s:02d}/{slide_name}"
-                try:
-                    with open(slide_path, "rb") as f:
-                        supabase.storage.from_("outputs").upload(
-                            storage_path,
-                            f.read(),
-                            {"content-type": "image/jpeg"},
-                        )
-                except Exception as upload_err:
-                    print(f"Warning: Failed to upload {storage_path}: {upload_err}")
-
-                # Insert variant record
-                try:
-                    supabase.table("variants").insert({
-                        "job_id": job_id,
-                        "file_path": storage_path,
-                        "file_size": file_size,
-                        "file_hash": file_hash,
-                        "transformations": {
-                            "type": "multiply",
-                            "set": s,
-                            "slide": m,
-                        },
-                    }).execute()
-                except Exception as db_err:
-                    print(f"Warning: Failed to insert variant record: {db_err}")
-
-                all_variants.append({
-                    "name": f"set_{s:02d}/{slide_name}",
-                    "path": str(slide_path),
-                })
+            # Upload to outputs bucket
+            storage_path = f"{user_id}/{job_id}/set_{s:02d}/{slide_name}"
+            try:
+                storage.upload("outputs", storage_path, data, "image/jpeg")
+            except Exception as upload_err:
+                print(f"Warning: Failed to upload {storage_path}: {upload_err}")
 
-                completed += 1
-                progress = int(completed / total_items * 95)  # Reserve 5% for ZIP
-                update_job_status(supabase, job_id, "processing", progress, completed)
+            # Insert variant record
+            try:
+                supabase.table("variants").insert({
+                    "job_id": job_id,
+                    "file_path": storage_path,
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                    "transformations": {
+                        "type": "multiply",
+                        "set": s,
+                        "slide": m,
+                        "augment_mode": mode,
+                        "seed": vseed,
+                        "uniqueness": uniqueness,
+                    },
+                }).execute()
+            except Exception as db_err:
+                print(f"Warning: Failed to insert variant record: {db_err}")
 
-            print(f"Set {s}/{copy_count} complete")
+            all_variants.append({
+                "name": f"set_{s:02d}/{slide_name}",
+                "path": str(slide_path),
+            })
+
+            completed += 1
+            progress = int(completed / total_items * 95)  # Reserve 5% for ZIP
+            update_job_status(supabase, job_id, "processing", progress, completed)
+
+            if m == slide_count:
+                print(f"Set {s}/{copy_count} complete")
+
+        for m, index in sorted(uniqueness_indexes.items()):
+            print(f"Perceptual uniqueness, slide {m}: {index.summary()}")
 
         # Create ZIP preserving folder structure
         print("Creating ZIP archive...")
@@ -1462,12 +2190,7 @@ def process_multiply(
 
         output_zip_storage = f"{user_id}/{job_id}/multiply.zip"
         try:
-            with open(zip_path, "rb") as f:
-                supabase.storage.from_("outputs").upload(
-                    output_zip_storage,
-                    f.read(),
-                    {"content-type": "application/zip"},
-                )
+            storage.upload_file("outputs", output_zip_storage, zip_path, "application/zip")
         except Exception as zip_err:
             print(f"Warning: Failed to upload ZIP: {zip_err}")
             output_zip_storage = None
@@ -1500,6 +2223,11 @@ def process_multiply(
         raise
 
     finally:
+        print(f"Storage transfers: {storage.metrics.summary()}")
+        print(f"Artifact cache: {artifacts.summary()}")
+        artifacts.commit()
+        if source_cache is not None:
+            source_cache.close()
         import shutil
         shutil.rmtree(work_dir, ignore_errors=True)
 
@@ -1527,6 +2255,8 @@ def start_multiply_processing(item: dict):
         user_id=item["user_id"],
         supabase_url=item["supabase_url"],
         supabase_key=item["supabase_key"],
+        augment_mode=item.get("augment_mode", "pixel"),
+        min_phash_distance=item.get("min_phash_distance", 0),
     )
 
     return {"status": "queued", "call_id": call.object_id}
@@ -1563,6 +2293,7 @@ def start_faceswap_processing(item: dict):
         user_id=item["user_id"],
         supabase_url=item["supabase_url"],
         supabase_key=item["supabase_key"],
+        images=item.get("images"),
     )
 
     return {"status": "queued", "call_id": call.object_id}
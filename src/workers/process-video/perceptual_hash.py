@@ -0,0 +1,231 @@
+"""
+Perceptual fingerprints for variant uniqueness checks.
+
+MD5 only proves that two files differ byte-wise. Here every image (or
+sampled video frame) is reduced to a 36x32 grayscale thumbnail and hashed
+twice:
+- dHash: sign of horizontal gradients on a 9x8 grid of block means (64 bits)
+- pHash: low-frequency 8x8 DCT coefficients against their median (64 bits)
+
+A frame hash is the bit-packed concatenation (16 bytes). An image
+fingerprint is one frame hash; a video fingerprint is VIDEO_FRAMES hashes
+taken at fixed fractions of its duration, so a variant lines up with its
+source. Distances are Hamming distances in bits per
+frame (0-128), computed for whole batches with XOR and a SWAR popcount
+on 64-bit words.
+"""
+
+import io
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ffmpeg_utils import seek_gray_frames
+
+THUMB_WIDTH = 36
+THUMB_HEIGHT = 32
+HASH_BYTES = 16
+VIDEO_FRAMES = 8
+
+# Rows of the distance matrix computed per step (bounds the XOR buffer)
+_MATRIX_CHUNK = 1024
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _dct_basis(n: int, keep: int = 8) -> np.ndarray:
+    """First `keep` rows of the orthonormal DCT-II matrix of size n."""
+    k = np.arange(keep)[:, None]
+    x = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    basis[0] /= np.sqrt(2)
+    return basis.astype(np.float32)
+
+
+_DCT_ROWS = _dct_basis(THUMB_HEIGHT)
+_DCT_COLS = _dct_basis(THUMB_WIDTH)
+
+
+def hash_thumbnails(thumbs: np.ndarray) -> np.ndarray:
+    """Frame hashes, (N, 16) uint8, of grayscale thumbnails shaped (N, 32, 36)."""
+    t = np.asarray(thumbs, dtype=np.float32)
+    n = len(t)
+
+    # dHash on 4x4 block means: 9 columns give 8 gradients per row
+    grid = t.reshape(n, 8, 4, 9, 4).mean(axis=(2, 4))
+    dbits = (grid[:, :, 1:] > grid[:, :, :-1]).reshape(n, 64)
+
+    # pHash: 2-D DCT restricted to the 8x8 low frequencies; the DC term is
+    # left out of the median so overall brightness does not decide the bits
+    coeffs = np.einsum("ih,nhw,jw->nij", _DCT_ROWS, t, _DCT_COLS).reshape(n, 64)
+    pbits = coeffs > np.median(coeffs[:, 1:], axis=1, keepdims=True)
+
+    return np.packbits(np.concatenate([dbits, pbits], axis=1), axis=1)
+
+
+def thumbnail(img: Image.Image) -> np.ndarray:
+    """36x32 grayscale thumbnail (JPEGs not yet loaded are decoded at reduced scale)."""
+    if img.format == "JPEG":
+        img.draft("L", (THUMB_WIDTH * 4, THUMB_HEIGHT * 4))
+    return np.asarray(img.convert("L").resize((THUMB_WIDTH, THUMB_HEIGHT), Image.BOX))
+
+
+def image_fingerprint(img: Image.Image) -> np.ndarray:
+    return hash_thumbnails(thumbnail(img)[None])[0]
+
+
+def image_fingerprints(images: Iterable[Image.Image]) -> np.ndarray:
+    """Fingerprints of several images, hashed as one batch."""
+    return hash_thumbnails(np.stack([thumbnail(img) for img in images]))
+
+
+def fingerprint_bytes(data: bytes) -> np.ndarray:
+    """Fingerprint of an encoded image."""
+    return image_fingerprint(Image.open(io.BytesIO(data)))
+
+
+def video_fingerprint(
+    path: Path,
+    duration: float,
+    frames: int = VIDEO_FRAMES,
+) -> Optional[np.ndarray]:
+    """Fingerprint of `frames` evenly spaced frames of a video.
+
+    Each frame is a single seek scaled and converted to gray by FFmpeg (see
+    seek_gray_frames), so a variant is not decoded again in full. Returns
+    None (with a warning) if decoding fails.
+    """
+    if duration <= 0:
+        return None
+    thumbs = seek_gray_frames(
+        str(path),
+        ((k + 0.5) * duration / frames for k in range(frames)),
+        THUMB_WIDTH,
+        THUMB_HEIGHT,
+    )
+    count = len(thumbs)
+    if count == 0:
+        print(f"Warning: Failed to fingerprint {path}")
+        return None
+    # Failed seeks leave fewer frames; repeat the last so lengths match
+    if count < frames:
+        thumbs = np.concatenate([thumbs, np.repeat(thumbs[-1:], frames - count, axis=0)])
+    return hash_thumbnails(thumbs).reshape(-1)
+
+
+def to_hex(fingerprint: np.ndarray) -> str:
+    return fingerprint.tobytes().hex()
+
+
+def from_hex(value: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(value), dtype=np.uint8)
+
+
+def _popcount64(x: np.ndarray) -> np.ndarray:
+    """Per-element bit count of a uint64 array (SWAR, no lookup gather)."""
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+def hamming_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Mean per-frame Hamming distances between fingerprint sets a (N, L) and b (M, L)."""
+    a = np.ascontiguousarray(np.atleast_2d(a)).view(np.uint64)
+    b = np.ascontiguousarray(np.atleast_2d(b)).view(np.uint64)
+    frames = a.shape[1] * 8 // HASH_BYTES
+    out = np.empty((len(a), len(b)), dtype=np.float32)
+    for start in range(0, len(a), _MATRIX_CHUNK):
+        rows = a[start:start + _MATRIX_CHUNK]
+        # Accumulate word by word: reducing over a tiny trailing axis is slow
+        total = np.zeros((len(rows), len(b)), dtype=np.uint64)
+        for w in range(a.shape[1]):
+            total += _popcount64(np.bitwise_xor(rows[:, w, None], b[None, :, w]))
+        out[start:start + _MATRIX_CHUNK] = total
+    return out / frames
+
+
+class UniquenessIndex:
+    """Fingerprints of a job's accepted variants, checked as each one arrives.
+
+    A candidate violates the index when it is closer than min_distance bits
+    to the source or to any accepted variant (min_distance 0 only records).
+    """
+
+    def __init__(self, source: Optional[np.ndarray] = None, min_distance: float = 0):
+        self.source = source
+        self.min_distance = min_distance
+        self._items: Optional[np.ndarray] = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def check(self, fingerprint: np.ndarray) -> Dict[str, Any]:
+        """Distance stats of a candidate against the source and accepted variants."""
+        stats: Dict[str, Any] = {"phash": to_hex(fingerprint)}
+        if self.source is not None:
+            stats["source_distance"] = round(float(hamming_matrix(fingerprint, self.source)[0, 0]), 2)
+        if self._count:
+            distances = hamming_matrix(fingerprint, self._items[:self._count])[0]
+            nearest = int(distances.argmin())
+            stats["nearest_distance"] = round(float(distances[nearest]), 2)
+            stats["nearest_variant"] = nearest + 1
+        return stats
+
+    def violates(self, stats: Dict[str, Any]) -> bool:
+        distances = [stats[k] for k in ("source_distance", "nearest_distance") if k in stats]
+        return bool(distances) and min(distances) < self.min_distance
+
+    def accept(
+        self,
+        render: Callable[[int], Any],
+        fingerprint_of: Callable[[Any], Optional[np.ndarray]],
+        max_regenerations: int,
+        first: Any = None,
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Render (or take `first` as attempt 0) until a result is unique enough.
+
+        render(attempt) produces a candidate; candidates violating the index
+        are re-rendered with the next attempt, and the last one is kept once
+        max_regenerations is reached. Returns (result, stats); stats is empty
+        when the result could not be fingerprinted.
+        """
+        result = first if first is not None else render(0)
+        for attempt in range(max_regenerations + 1):
+            if attempt:
+                result = render(attempt)
+            fingerprint = fingerprint_of(result)
+            if fingerprint is None:
+                return result, {}
+            stats = self.check(fingerprint)
+            if not self.violates(stats) or attempt == max_regenerations:
+                break
+            print(f"Variant too similar ({stats}), regenerating")
+        self.add(fingerprint)
+        stats["regenerations"] = attempt
+        return result, stats
+
+    def add(self, fingerprint: np.ndarray) -> None:
+        if self._items is None:
+            self._items = np.empty((16, len(fingerprint)), dtype=np.uint8)
+        elif self._count == len(self._items):
+            self._items = np.concatenate([self._items, np.empty_like(self._items)])
+        self._items[self._count] = fingerprint
+        self._count += 1
+
+    def summary(self) -> str:
+        """Pairwise distance stats over all accepted variants."""
+        if self._count < 2:
+            return f"{self._count} fingerprinted"
+        items = self._items[:self._count]
+        pairs = hamming_matrix(items, items)[np.triu_indices(self._count, k=1)]
+        return (
+            f"{self._count} fingerprinted, pairwise min {pairs.min():.1f} / "
+            f"mean {pairs.mean():.1f} bits"
+        )
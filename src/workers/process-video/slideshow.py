@@ -0,0 +1,202 @@
+"""
+Slideshow video rendering for caption carousels.
+
+Frames are composed in-process and piped as raw RGB to a single FFmpeg
+encoder, instead of opening one looped input per slide and chaining n-1
+xfade filters. Only two decoded slides are held at a time, so memory and
+filter-graph size no longer grow with slide count.
+
+Timeline (same as the former xfade graph): every slide is held for `pause`
+seconds, followed by a `scroll`-second slideleft transition into the next
+slide. The last slide is held for `pause` with no trailing transition.
+
+BackgroundSlideshow runs the same renderer on a worker thread, fed slide by
+slide, so encoding overlaps variant rendering, uploads and the ZIP build.
+"""
+
+import queue
+import subprocess
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+SlideSource = Union[Path, str, Image.Image]
+
+
+def _load_slide(source: SlideSource, size: Optional[Tuple[int, int]]) -> np.ndarray:
+    img = source if isinstance(source, Image.Image) else Image.open(source)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if size is not None and img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    return np.ascontiguousarray(np.asarray(img))
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def slideleft_frames(first: np.ndarray, second: np.ndarray, count: int) -> Iterator[np.ndarray]:
+    """Frames of an xfade-style slideleft transition from first to second.
+
+    Frame k shows first shifted left by k/count of the width, with second
+    entering from the right; frame 0 is the untouched first slide. The same
+    buffer is reused for every frame, so consume each before the next.
+    """
+    width = first.shape[1]
+    frame = np.empty_like(first)
+    for k in range(count):
+        shift = (k * width) // count
+        frame[:, :width - shift] = first[:, shift:]
+        frame[:, width - shift:] = second[:, :shift]
+        yield frame
+
+
+def slideshow_frame_count(n: int, pause: float, scroll: float, fps: int) -> int:
+    """Total frames for n slides."""
+    return n * round(pause * fps) + (n - 1) * round(scroll * fps)
+
+
+def render_slideshow(
+    slides: Iterable[SlideSource],
+    output_path: Path,
+    pause: float = 2.0,
+    scroll: float = 0.2,
+    crf: int = 18,
+    fps: int = 30,
+    cancel: Optional[threading.Event] = None,
+) -> bool:
+    """Render slides (paths or decoded images) to an H.264 slideshow.
+
+    slides is consumed lazily, so it may be a generator (or queue-backed
+    iterator) that yields variants while they are still being produced.
+    All slides are fitted to the first slide's size. Hold frames are written
+    straight from the decoded slide's buffer; only transition frames are
+    composed. Returns False (with a warning) if encoding fails.
+
+    Setting `cancel` stops the render between frames: the encoder is
+    killed, the partial output removed, and False returned.
+    """
+    slides = iter(slides)
+    first = next(slides, None)
+    upcoming = next(slides, None)
+    if first is None or upcoming is None:
+        return False
+
+    hold_frames = round(pause * fps)
+    scroll_frames = round(scroll * fps)
+
+    current = _load_slide(first, None)
+    height, width = current.shape[:2]
+
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24",
+        "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-r", str(fps), "-crf", str(crf),
+        "-map_metadata", "-1", "-fflags", "+bitexact",
+        str(output_path),
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    cancel = cancel or threading.Event()
+
+    def write(frame) -> None:
+        if cancel.is_set():
+            raise _Cancelled
+        proc.stdin.write(frame)
+
+    try:
+        while True:
+            hold = memoryview(current)
+            for _ in range(hold_frames):
+                write(hold)
+            if upcoming is None:
+                break
+            following = _load_slide(upcoming, (width, height))
+            for frame in slideleft_frames(current, following, scroll_frames):
+                write(frame)
+            current = following
+            upcoming = next(slides, None)
+            if cancel.is_set():
+                raise _Cancelled
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    except _Cancelled:
+        proc.kill()
+        proc.wait()
+        Path(output_path).unlink(missing_ok=True)
+        return False
+    except Exception:
+        proc.kill()
+        proc.wait()
+        raise
+
+    stderr = proc.stderr.read().decode(errors="replace")
+    proc.wait()
+    if proc.returncode != 0:
+        print(f"Warning: Slideshow generation failed: {stderr[-300:]}")
+        return False
+    return True
+
+
+class BackgroundSlideshow:
+    """Render a slideshow on a worker thread from slides added as they exist.
+
+    add() each slide in order while variants are produced, then finish()
+    to wait for the encode. Failures are reported as a warning and a False
+    result, never raised.
+    """
+
+    _DONE = object()
+
+    def __init__(self, output_path: Path, **options):
+        self.output_path = Path(output_path)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._ok = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(options,), daemon=True)
+        self._thread.start()
+
+    def _slides(self) -> Iterator[SlideSource]:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            yield item
+
+    def _run(self, options) -> None:
+        try:
+            self._ok = render_slideshow(
+                self._slides(), self.output_path, cancel=self._cancel, **options
+            )
+        except Exception as e:
+            print(f"Warning: Slideshow generation failed: {e}")
+
+    def add(self, slide: SlideSource) -> None:
+        self._queue.put(slide)
+
+    def finish(self, timeout: Optional[float] = None) -> bool:
+        """Signal the last slide, wait for encoding, return whether it succeeded."""
+        self._queue.put(self._DONE)
+        self._thread.join(timeout)
+        return self._ok and not self._thread.is_alive() and self.output_path.exists()
+
+    def abort(self) -> None:
+        """Stop the render (e.g. when the job failed) and wait for it to exit.
+
+        Queued slides are dropped and the encoder is killed, so nothing is
+        written once this returns and the work directory can be removed.
+        """
+        self._cancel.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put(self._DONE)
+        self._thread.join()
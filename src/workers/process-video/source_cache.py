@@ -0,0 +1,158 @@
+"""
+Memory-bounded cache of source images for multi-source image jobs.
+
+Multi-photo captions and carousel multiply read the same handful of source
+images over and over. SourceImageCache keeps two LRU tiers under separate
+byte budgets:
+- compressed: the downloaded file bytes (cheap to keep, costly to refetch)
+- decoded: the ready-to-render image built from them
+
+When the decoded tier is full the least recently used image is dropped and
+rebuilt from its bytes on the next access, so a carousel larger than the
+budget costs a re-decode, not a re-download. Upcoming sources can be
+prefetched (downloaded and decoded) on a small thread pool while the
+current ones render.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
+
+from PIL import Image
+
+DEFAULT_DECODED_BUDGET = 1536 * 1024 * 1024
+DEFAULT_COMPRESSED_BUDGET = 512 * 1024 * 1024
+DEFAULT_FETCH_WORKERS = 4
+
+
+def image_nbytes(value: Any) -> int:
+    """Approximate in-memory size of a decoded source (PIL image or wrapper)."""
+    img = value if isinstance(value, Image.Image) else getattr(value, "image", None)
+    if isinstance(img, Image.Image):
+        return img.width * img.height * len(img.getbands())
+    return 0
+
+
+class SourceImageCache:
+    """Two-tier LRU cache of source images keyed by storage path."""
+
+    def __init__(
+        self,
+        fetch: Callable[[str], bytes],
+        decode: Callable[[bytes], Any],
+        decoded_budget: int = DEFAULT_DECODED_BUDGET,
+        compressed_budget: int = DEFAULT_COMPRESSED_BUDGET,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        sizeof: Callable[[Any], int] = image_nbytes,
+    ):
+        self.fetch = fetch
+        self.decode = decode
+        self.decoded_budget = decoded_budget
+        self.compressed_budget = compressed_budget
+        self.sizeof = sizeof
+
+        self._lock = threading.Lock()
+        self._decoded: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, nbytes)
+        self._compressed: "OrderedDict[str, bytes]" = OrderedDict()
+        self._decoded_bytes = 0
+        self._compressed_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=fetch_workers)
+
+        self.downloads = 0
+        self.decodes = 0
+
+    def get(self, key: str) -> Any:
+        """Return the decoded source for key, loading it if necessary."""
+        with self._lock:
+            hit = self._decoded.get(key)
+            if hit is not None:
+                self._decoded.move_to_end(key)
+                return hit[0]
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._pool.submit(self._load, key)
+                self._inflight[key] = future
+        return future.result()
+
+    def get_bytes(self, key: str) -> bytes:
+        """Return the downloaded bytes for key, loading the source if necessary."""
+        with self._lock:
+            data = self._compressed.get(key)
+        if data is None:
+            self.get(key)
+            with self._lock:
+                data = self._compressed.get(key)
+        # Only refetched if the compressed tier already evicted it again
+        return data if data is not None else self.fetch(key)
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        """Start loading keys that are neither cached nor already in flight."""
+        with self._lock:
+            for key in keys:
+                if key not in self._decoded and key not in self._inflight:
+                    self._inflight[key] = self._pool.submit(self._load, key)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._decoded.clear()
+            self._compressed.clear()
+            self._decoded_bytes = self._compressed_bytes = 0
+
+    def __enter__(self) -> "SourceImageCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _load(self, key: str) -> Any:
+        try:
+            with self._lock:
+                data = self._compressed.get(key)
+                if data is not None:
+                    self._compressed.move_to_end(key)
+            if data is None:
+                data = self.fetch(key)
+                with self._lock:
+                    self.downloads += 1
+                    self._store_compressed(key, data)
+
+            value = self.decode(data)
+            with self._lock:
+                self.decodes += 1
+                self._store_decoded(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _store_compressed(self, key: str, data: bytes) -> None:
+        if key in self._compressed:
+            return
+        self._compressed[key] = data
+        self._compressed_bytes += len(data)
+        while self._compressed_bytes > self.compressed_budget and len(self._compressed) > 1:
+            _, old = self._compressed.popitem(last=False)
+            self._compressed_bytes -= len(old)
+
+    def _store_decoded(self, key: str, value: Any) -> None:
+        if key in self._decoded:
+            return
+        nbytes = self.sizeof(value)
+        self._decoded[key] = (value, nbytes)
+        self._decoded_bytes += nbytes
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while self._decoded_bytes > self.decoded_budget and len(self._decoded) > 1:
+            _, (_, old_bytes) = self._decoded.popitem(last=False)
+            self._decoded_bytes -= old_bytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "downloads": self.downloads,
+                "decodes": self.decodes,
+                "decoded_bytes": self._decoded_bytes,
+                "compressed_bytes": self._compressed_bytes,
+            }
@@ -0,0 +1,665 @@
+"""
+Object storage access for the worker.
+
+Every transfer goes through a StorageBackend:
+- SupabaseStorage: Supabase Storage REST API over a pooled keep-alive
+  httpx.Client (one client per project, shared across jobs in a warm
+  container), with retry + jittered exponential backoff and an adaptive
+  concurrency limit that backs off when the API throttles. Files above one
+  chunk are uploaded with the resumable (TUS) protocol, streamed from disk
+  in TUS_CHUNK_SIZE pieces and resumed from the server's offset on failure
+- LocalStorage: buckets as directories under a root (local runs and
+  benchmarks)
+
+Both expose the same single-object and bounded-concurrency batch APIs, and
+count bytes, requests, retries and latency in a per-backend TransferMetrics.
+"""
+
+import base64
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+import httpx
+
+# Retry policy: full-jitter exponential backoff, honouring Retry-After
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+# Connection pool and concurrency bounds per Supabase project
+MAX_CONNECTIONS = 16
+MAX_CONCURRENCY = 8
+
+# Resumable (TUS) uploads: Supabase requires 6 MB chunks; files larger than
+# one chunk go through it so a failure resumes instead of restarting
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+TUS_VERSION = "1.0.0"
+
+UploadItem = Tuple[str, Union[bytes, Path], str]  # (path, data or file, content type)
+
+
+class StorageError(Exception):
+    """A storage request failed (after retries, where retryable)."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed operation may succeed if the job is retried.
+
+    Network and timeout errors and retryable HTTP statuses qualify; bad
+    input (missing objects, unreadable media, no face found) does not.
+    """
+    if isinstance(error, StorageError):
+        return error.status is None or error.status in RETRY_STATUSES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class TransferMetrics:
+    """Thread-safe transfer counters for one backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.retries = 0
+            self.throttled = 0
+            self.failures = 0
+            self.bytes_up = 0
+            self.bytes_down = 0
+            self.seconds = 0.0
+            self.max_seconds = 0.0
+
+    def record(self, seconds: float, up: int = 0, down: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_up += up
+            self.bytes_down += down
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "bytes_up": self.bytes_up,
+                "bytes_down": self.bytes_down,
+                "avg_latency_ms": round(self.seconds / self.requests * 1000, 1) if self.requests else 0.0,
+                "max_latency_ms": round(self.max_seconds * 1000, 1),
+            }
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return (
+            f"{s['requests']} requests, "
+            f"{s['bytes_up'] / 1e6:.1f} MB up, {s['bytes_down'] / 1e6:.1f} MB down, "
+            f"avg {s['avg_latency_ms']} ms, max {s['max_latency_ms']} ms, "
+            f"{s['retries']} retries, {s['throttled']} throttled, {s['failures']} failed"
+        )
+
+
+class AdaptiveLimit:
+    """Concurrency limit with additive increase / multiplicative decrease.
+
+    Halves on throttling responses and grows by one after `limit`
+    consecutive successes, up to `maximum`.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self.limit = maximum
+        self._active = 0
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> "AdaptiveLimit":
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def throttled(self) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._streak = 0
+
+    def succeeded(self) -> None:
+        with self._cond:
+            self._streak += 1
+            if self._streak >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._streak = 0
+                self._cond.notify_all()
+
+
+class StorageBackend:
+    """Common interface; subclasses implement the single-object calls."""
+
+    max_concurrency = MAX_CONCURRENCY
+
+    def __init__(self):
+        self.metrics = TransferMetrics()
+
+    def download(self, bucket: str, path: str) -> bytes:
+        raise NotImplementedError
+
+    def etag(self, bucket: str, path: str) -> Optional[str]:
+        """Version tag of an object (changes when it is overwritten), or None."""
+        return None
+
+    def download_to(self, bucket: str, path: str, dest: Path) -> Path:
+        """Download an object into a local file."""
+        Path(dest).write_bytes(self.download(bucket, path))
+        return Path(dest)
+
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        data: bytes,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        raise NotImplementedError
+
+    def upload_file(
+        self,
+        bucket: str,
+        path: str,
+        file_path: Path,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        """Upload a local file."""
+        self.upload(bucket, path, Path(file_path).read_bytes(), content_type, upsert)
+
+    def remove(self, bucket: str, paths: Sequence[str]) -> None:
+        raise NotImplementedError
+
+    def download_many(
+        self,
+        bucket: str,
+        paths: Sequence[str],
+    ) -> List[Union[bytes, Exception]]:
+        """Download objects concurrently; failures are returned, not raised."""
+        def one(path: str) -> Union[bytes, Exception]:
+            try:
+                return self.download(bucket, path)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(one, paths))
+
+    def upload_many(
+        self,
+        bucket: str,
+        items: Sequence[UploadItem],
+    ) -> List[Optional[Exception]]:
+        """Upload (path, bytes-or-file, content type) items concurrently.
+
+        Returns one entry per item: None on success, else the exception.
+        """
+        def one(item: UploadItem) -> Optional[Exception]:
+            path, data, content_type = item
+            try:
+                if isinstance(data, Path):
+                    self.upload_file(bucket, path, data, content_type)
+                else:
+                    self.upload(bucket, path, data, content_type)
+                return None
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(one, items))
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage over the REST API with pooling, retries and AIMD."""
+
+    _clients: Dict[Tuple[str, str], httpx.Client] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(
+        self,
+        supabase_url: str,
+        supabase_key: str,
+        max_concurrency: int = MAX_CONCURRENCY,
+        retries: int = MAX_RETRIES,
+    ):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.client = self._client(supabase_url.rstrip("/"), supabase_key)
+
+    @classmethod
+    def _client(cls, url: str, key: str) -> httpx.Client:
+        # Keep-alive pool shared by every job a warm container runs
+        with cls._clients_lock:
+            client = cls._clients.get((url, key))
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    base_url=f"{url}/storage/v1",
+                    headers={"Authorization": f"Bearer {key}", "apikey": key},
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_CONNECTIONS,
+                        keepalive_expiry=60,
+                    ),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                )
+                cls._clients[(url, key)] = client
+            return client
+
+    @staticmethod
+    def _object_url(bucket: str, path: str) -> str:
+        return f"/object/{quote(bucket)}/{quote(path, safe='/')}"
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(BACKOFF_MAX, float(retry_after))
+                except ValueError:
+                    pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        dest: Optional[Path],
+        **kwargs,
+    ) -> Tuple[httpx.Response, int]:
+        """One attempt; streams a successful body into dest when given."""
+        if dest is None:
+            response = self.client.request(method, url, **kwargs)
+            return response, len(response.content)
+        with self.client.stream(method, url, **kwargs) as response:
+            if response.status_code >= 400:
+                response.read()
+                return response, 0
+            received = 0
+            with open(dest, "wb") as f:
+                for chunk in response.iter_bytes(1 << 20):
+                    f.write(chunk)
+                    received += len(chunk)
+            return response, received
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        up: int = 0,
+        dest: Optional[Path] = None,
+        retries: Optional[int] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send one request with retries; returns the successful response."""
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                with self.limit:
+                    response, received = self._request(method, url, dest, **kwargs)
+            except httpx.TransportError as e:
+                response, error = None, e
+            else:
+                if response.status_code < 400:
+                    self.limit.succeeded()
+                    self.metrics.record(time.perf_counter() - start, up=up, down=received)
+                    return response
+                error = StorageError(
+                    f"{method} {url}: {response.status_code} {response.text[:200]}",
+                    response.status_code,
+                )
+
+            self.metrics.record(time.perf_counter() - start)
+            if response is not None and response.status_code in THROTTLE_STATUSES:
+                self.limit.throttled()
+                self.metrics.count("throttled")
+            retryable = response is None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt == retries:
+                self.metrics.count("failures")
+                raise error
+            self.metrics.count("retries")
+            time.sleep(self._backoff(attempt, response))
+        raise AssertionError("unreachable")
+
+    def download(self, bucket: str, path: str) -> bytes:
+        return self._send("GET", self._object_url(bucket, path)).content
+
+    def etag(self, bucket: str, path: str) -> Optional[str]:
+        try:
+            response = self._send("HEAD", self._object_url(bucket, path), retries=1)
+        except (httpx.TransportError, StorageError):
+            return None
+        return response.headers.get("etag")
+
+    def download_to(self, bucket: str, path: str, dest: Path) -> Path:
+        # Streamed to disk: large source videos never sit in memory
+        self._send("GET", self._object_url(bucket, path), dest=Path(dest))
+        return Path(dest)
+
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        data: bytes,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        # Upsert by default so a retry after an ambiguous failure (the first
+        # attempt may have landed) does not fail as a duplicate
+        self._send(
+            "POST",
+            self._object_url(bucket, path),
+            up=len(data),
+            content=data,
+            headers={
+                "content-type": content_type,
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+
+    def upload_file(
+        self,
+        bucket: str,
+        path: str,
+        file_path: Path,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        if Path(file_path).stat().st_size > TUS_CHUNK_SIZE:
+            self.upload_resumable(bucket, path, file_path, content_type, upsert)
+        else:
+            super().upload_file(bucket, path, file_path, content_type, upsert)
+
+    def upload_resumable(
+        self,
+        bucket: str,
+        path: str,
+        file_path: Path,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        """Upload a file with the TUS protocol in constant memory.
+
+        Chunks are sent in order (TUS offsets are sequential); concurrency
+        comes from uploading several files at once (upload_many). After a
+        failed chunk the server's offset is re-read with HEAD and the upload
+        continues from the last acknowledged byte.
+        """
+        size = Path(file_path).stat().st_size
+        metadata = {
+            "bucketName": bucket,
+            "objectName": path,
+            "contentType": content_type,
+        }
+        created = self._send(
+            "POST",
+            "/upload/resumable",
+            headers={
+                "tus-resumable": TUS_VERSION,
+                "upload-length": str(size),
+                "upload-metadata": ",".join(
+                    f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in metadata.items()
+                ),
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+        location = created.headers["location"]
+
+        offset = 0
+        failures = 0
+        with open(file_path, "rb") as f:
+            while offset < size:
+                f.seek(offset)
+                chunk = f.read(TUS_CHUNK_SIZE)
+                try:
+                    response = self._send(
+                        "PATCH",
+                        location,
+                        up=len(chunk),
+                        retries=0,
+                        content=chunk,
+                        headers={
+                            "tus-resumable": TUS_VERSION,
+                            "upload-offset": str(offset),
+                            "content-type": "application/offset+octet-stream",
+                        },
+                    )
+                    offset = int(response.headers.get("upload-offset", offset + len(chunk)))
+                    failures = 0
+                except (httpx.TransportError, StorageError):
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    time.sleep(self._backoff(failures - 1, None))
+                    head = self._send("HEAD", location, headers={"tus-resumable": TUS_VERSION})
+                    offset = int(head.headers["upload-offset"])
+
+    def remove(self, bucket: str, paths: Sequence[str]) -> None:
+        if paths:
+            self._send("DELETE", f"/object/{quote(bucket)}", json={"prefixes": list(paths)})
+
+
+class LocalStorage(StorageBackend):
+    """Buckets as directories under root."""
+
+    def __init__(self, root: Path, max_concurrency: int = MAX_CONCURRENCY):
+        super().__init__()
+        self.root = Path(root)
+        self.max_concurrency = max_concurrency
+
+    def _file(self, bucket: str, path: str) -> Path:
+        return self.root / bucket / path
+
+    def download(self, bucket: str, path: str) -> bytes:
+        start = time.perf_counter()
+        try:
+            data = self._file(bucket, path).read_bytes()
+        except FileNotFoundError:
+            self.metrics.count("failures")
+            raise StorageError(f"{bucket}/{path}: not found", 404)
+        self.metrics.record(time.perf_counter() - start, down=len(data))
+        return data
+
+    def etag(self, bucket: str, path: str) -> Optional[str]:
+        try:
+            st = self._file(bucket, path).stat()
+        except OSError:
+            return None
+        return f"{st.st_size}-{st.st_mtime_ns}"
+
+    def download_to(self, bucket: str, path: str, dest: Path) -> Path:
+        start = time.perf_counter()
+        src = self._file(bucket, path)
+        if not src.exists():
+            self.metrics.count("failures")
+            raise StorageError(f"{bucket}/{path}: not found", 404)
+        shutil.copyfile(src, dest)
+        self.metrics.record(time.perf_counter() - start, down=src.stat().st_size)
+        return Path(dest)
+
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        data: bytes,
+        content_type: str,
+        upsert: bool = True,
+    ) -> None:
+        start = time.perf_counter()
+        target = self._file(bucket, path)
+        if target.exists() and not upsert:
+            self.metrics.count("failures")
+            raise StorageError(f"{bucket}/{path}: already exists", 409)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(target)
+        self.metrics.record(time.perf_counter() - start, up=len(data))
+
+    def remove(self, bucket: str, paths: Sequence[str]) -> None:
+        for path in paths:
+            self._file(bucket, path).unlink(missing_ok=True)
+
+
+def open_storage(supabase_url: str, supabase_key: str) -> StorageBackend:
+    """Storage for one job: LocalStorage under STORAGE_DIR when set, else Supabase."""
+    local_root = os.environ.get("STORAGE_DIR")
+    if local_root:
+        return LocalStorage(Path(local_root))
+    return SupabaseStorage(supabase_url, supabase_key)
+
+
+def _serve_local(root: Path, drop_every: int = 0):
+    """Minimal stand-in for Supabase Storage (objects + TUS) on localhost.
+
+    Every drop_every-th PATCH stores only half its chunk and drops the
+    connection without answering, to exercise resume. Returns the server;
+    its base URL is http://127.0.0.1:<server.server_port>.
+    """
+    import uuid
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    uploads: Dict[str, dict] = {}
+    patches = [0]
+    prefix = "/storage/v1"
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _reply(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("content-length", 0)))
+
+        def do_GET(self) -> None:
+            target = root / self.path[len(f"{prefix}/object/"):]
+            if target.is_file():
+                self._reply(200, target.read_bytes())
+            else:
+                self._reply(400, b'{"statusCode":"404"}')
+
+        def do_POST(self) -> None:
+            if self.path == f"{prefix}/upload/resumable":
+                meta = dict(
+                    (k, base64.b64decode(v).decode())
+                    for k, v in (item.split(" ") for item in self.headers["upload-metadata"].split(","))
+                )
+                uid = uuid.uuid4().hex
+                target = root / meta["bucketName"] / meta["objectName"]
+                target.parent.mkdir(parents=True, exist_ok=True)
+                part = target.with_name(f".{uid}.part")
+                part.write_bytes(b"")
+                uploads[uid] = {"length": int(self.headers["upload-length"]), "part": part, "target": target}
+                host = f"http://127.0.0.1:{self.server.server_port}"
+                self._reply(201, headers={"Location": f"{host}{prefix}/upload/resumable/{uid}"})
+            else:
+                target = root / self.path[len(f"{prefix}/object/"):]
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(self._body())
+                self._reply(200, b"{}")
+
+        def do_HEAD(self) -> None:
+            up = uploads[self.path.rsplit("/", 1)[1]]
+            self._reply(200, headers={"Upload-Offset": str(up["part"].stat().st_size)})
+
+        def do_PATCH(self) -> None:
+            up = uploads[self.path.rsplit("/", 1)[1]]
+            body = self._body()
+            offset = up["part"].stat().st_size
+            if int(self.headers["upload-offset"]) != offset:
+                self._reply(409)
+                return
+            patches[0] += 1
+            if drop_every and patches[0] % drop_every == 0:
+                with open(up["part"], "ab") as f:
+                    f.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            with open(up["part"], "ab") as f:
+                f.write(body)
+            offset += len(body)
+            if offset == up["length"]:
+                up["part"].replace(up["target"])
+                up["part"] = up["target"]
+            self._reply(204, headers={"Upload-Offset": str(offset)})
+
+        def do_DELETE(self) -> None:
+            import json
+            bucket = self.path.rsplit("/", 1)[1]
+            for key in json.loads(self._body())["prefixes"]:
+                (root / bucket / key).unlink(missing_ok=True)
+            self._reply(200, b"[]")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    # Round-trip a file through the resumable path against the local
+    # stand-in server, with dropped chunks: python storage.py [size_mb]
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        server = _serve_local(tmp / "server", drop_every=3)
+        backend = SupabaseStorage(f"http://127.0.0.1:{server.server_port}", "local")
+
+        src = tmp / "upload.bin"
+        src.write_bytes(os.urandom(size_mb * 1024 * 1024))
+        start = time.perf_counter()
+        backend.upload_file("outputs", "check/upload.bin", src, "application/octet-stream")
+        elapsed = time.perf_counter() - start
+        back = backend.download_to("outputs", "check/upload.bin", tmp / "download.bin")
+
+        ok = back.read_bytes() == src.read_bytes()
+        print(f"{size_mb} MB resumable upload in {elapsed:.2f}s, round trip {'OK' if ok else 'MISMATCH'}")
+        print(f"Storage transfers: {backend.metrics.summary()}")
+        server.shutdown()
+        sys.exit(0 if ok else 1)
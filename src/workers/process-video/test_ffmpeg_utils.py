@@ -0,0 +1,54 @@
+"""Watermark region detection on synthetic frame stacks (no FFmpeg needed)."""
+
+import numpy as np
+
+from ffmpeg_utils import WATERMARK_MIN_CONFIDENCE, find_overlay_regions
+
+FRAMES, HEIGHT, WIDTH = 16, 180, 320
+
+
+def moving_content(seed: int = 0) -> np.ndarray:
+    """Frames of busy content that changes every frame."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (FRAMES, HEIGHT, WIDTH), dtype=np.uint8)
+
+
+def logo(frames: np.ndarray, y: int, x: int, h: int = 24, w: int = 64) -> np.ndarray:
+    """Burn the same block of thin high-contrast strokes (like text) into every frame."""
+    frames = frames.copy()
+    block = np.where((np.arange(w) // 2) % 2 == 0, 255, 0).astype(np.uint8)
+    frames[:, y:y + h, x:x + w] = block
+    return frames
+
+
+def test_static_shot_has_no_watermark():
+    # A still frame with strong edges everywhere (shapes, a text-like
+    # block in a corner, letterbox bars): nothing moves, nothing is an overlay
+    frame = np.full((HEIGHT, WIDTH), 90, dtype=np.uint8)
+    frame[:20], frame[-20:] = 0, 0
+    frame[60:120, 40:140] = 220
+    frame[140:156, 230:300] = np.where((np.arange(70) // 3) % 2 == 0, 255, 30)
+    frames = np.repeat(frame[None], FRAMES, axis=0)
+    assert find_overlay_regions(frames, 1280, 720) == []
+
+
+def test_letterbox_over_moving_content_is_not_a_watermark():
+    frames = moving_content()
+    frames[:, :20], frames[:, -20:] = 0, 0
+    assert find_overlay_regions(frames, 1280, 720) == []
+
+
+def test_corner_logo_over_moving_content_is_found():
+    frames = logo(moving_content(), y=148, x=240)
+    regions = find_overlay_regions(frames, 1280, 720)
+    assert len(regions) == 1
+    box = regions[0]
+    # Analysis is at 1/4 of the source size; the box covers the logo
+    assert box["x"] <= 240 * 4 and box["x"] + box["width"] >= (240 + 64) * 4 - 8
+    assert box["y"] <= 148 * 4 and box["y"] + box["height"] >= (148 + 24) * 4 - 8
+    assert box["confidence"] >= WATERMARK_MIN_CONFIDENCE
+
+
+def test_mid_frame_static_object_is_not_a_watermark():
+    frames = logo(moving_content(), y=78, x=128)
+    assert find_overlay_regions(frames, 1280, 720) == []
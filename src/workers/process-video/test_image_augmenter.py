@@ -0,0 +1,61 @@
+"""encode_clean / save_clean must drop every metadata segment."""
+
+import io
+import random
+import struct
+
+from PIL import Image, ImageCms
+
+from image_augmenter import encode_clean, save_clean
+
+# SOI, APP0 (JFIF), DQT, SOF0-2, DHT, SOS, EOI
+ALLOWED_MARKERS = {0xD8, 0xE0, 0xDB, 0xC0, 0xC1, 0xC2, 0xC4, 0xDA, 0xD9}
+
+
+def jpeg_markers(data: bytes) -> list:
+    """Marker codes of a JPEG's segments, in order, up to and including EOI."""
+    assert data[:2] == b"\xff\xd8"
+    markers, pos = [0xD8], 2
+    while pos < len(data):
+        assert data[pos] == 0xFF
+        marker = data[pos + 1]
+        markers.append(marker)
+        if marker == 0xD9:
+            break
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        pos += 2 + length
+        if marker == 0xDA:
+            # Skip entropy-coded data: 0xFF is followed by 0x00 or RSTn there
+            while not (data[pos] == 0xFF and data[pos + 1] not in (0x00, *range(0xD0, 0xD8))):
+                pos += 1
+    return markers
+
+
+def tagged_image() -> Image.Image:
+    """A JPEG carrying EXIF, an ICC profile and a comment, opened lazily."""
+    exif = Image.Exif()
+    exif[0x010F] = "CameraMaker"
+    exif[0x0131] = "EditorApp"
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 80, 40)).save(
+        buf, format="JPEG", exif=exif.tobytes(), icc_profile=icc, comment=b"shot on a phone",
+    )
+    img = Image.open(io.BytesIO(buf.getvalue()))
+    assert {"exif", "icc_profile", "comment"} <= set(img.info)
+    return img
+
+
+def test_encode_clean_keeps_only_image_segments():
+    data = encode_clean(tagged_image(), random.Random(0))
+    markers = jpeg_markers(data)
+    assert set(markers) <= ALLOWED_MARKERS, [hex(m) for m in markers]
+    assert markers[-1] == 0xD9
+
+
+def test_save_clean_writes_the_same_clean_bytes(tmp_path):
+    path = tmp_path / "out.jpg"
+    data = save_clean(tagged_image(), path, random.Random(0))
+    assert path.read_bytes() == data
+    assert set(jpeg_markers(data)) <= ALLOWED_MARKERS
@@ -6,10 +6,18 @@ Renders caption text on images with TikTok-style formatting:
 - Anton bold font (bundled TTF)
 - White text with black stroke
 - UPPERCASE, word-wrapped to 90% of image width
+
+Captions are rasterized once into a tight RGBA sprite (stroke included) and
+alpha-composited onto each frame within the sprite's bounding box only.
 """
 
+import io
+import math
 import re
+import threading
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
 from PIL import Image, ImageDraw, ImageFont
 
 
@@ -47,85 +55,137 @@ FONT_SIZES = {
 }
 
 
-def resize_and_crop(img: Image.Image) -> Image.Image:
-    """Resize image to fill 1080x1920, then center-crop to exact dimensions."""
-    target_ratio = TARGET_WIDTH / TARGET_HEIGHT
-    img_ratio = img.width / img.height
+class CaptionLayout(NamedTuple):
+    """Positioned lines of a caption: (text, x, y) per line, top-left origin."""
+    lines: tuple[tuple[str, int, int], ...]
+    px_size: int
 
-    if img_ratio > target_ratio:
-        new_height = TARGET_HEIGHT
-        new_width = int(img.width * (TARGET_HEIGHT / img.height))
-    else:
-        new_width = TARGET_WIDTH
-        new_height = int(img.height * (TARGET_WIDTH / img.width))
 
-    img = img.resize((new_width, new_height), Image.LANCZOS)
+STROKE_WIDTH = 3
 
-    left = (new_width - TARGET_WIDTH) // 2
-    top = (new_height - TARGET_HEIGHT) // 2
-    img = img.crop((left, top, left + TARGET_WIDTH, top + TARGET_HEIGHT))
+# FreeType faces are shared through load_font's cache and are not safe to
+# use from several threads at once; cache misses below take this lock so
+# variant workers can share layouts and sprites.
+_FONT_LOCK = threading.RLock()
+
+
+class CaptionSprite(NamedTuple):
+    """Rasterized caption (RGBA) and its top-left position on the canvas."""
+    image: Image.Image
+    x: int
+    y: int
+
+
+@lru_cache(maxsize=16)
+def load_font(font_path: str, px_size: int) -> ImageFont.FreeTypeFont:
+    """Load a TrueType font once per (path, size) instead of per caption."""
+    return ImageFont.truetype(font_path, px_size)
+
+
+@lru_cache(maxsize=8192)
+def _advance(font_path: str, px_size: int, text: str) -> float:
+    """Cached horizontal advance of text (a single word or a space)."""
+    return load_font(font_path, px_size).getlength(text)
 
-    return img
+
+def _fill_scale(width: int, height: int) -> float:
+    """Scale factor at which an image just covers the 1080x1920 canvas."""
+    return max(TARGET_WIDTH / width, TARGET_HEIGHT / height)
+
+
+def resize_and_crop(img: Image.Image) -> Image.Image:
+    """Resize image to fill 1080x1920, then center-crop to exact dimensions.
+
+    The crop is applied in source coordinates (resize box=) so discarded
+    pixels are never filtered, and reducing_gap lets Pillow shrink by an
+    integer factor with reduce() before the final LANCZOS resample.
+    """
+    scale = _fill_scale(img.width, img.height)
+    box_width = TARGET_WIDTH / scale
+    box_height = TARGET_HEIGHT / scale
+    left = (img.width - box_width) / 2
+    top = (img.height - box_height) / 2
+
+    return img.resize(
+        (TARGET_WIDTH, TARGET_HEIGHT),
+        Image.LANCZOS,
+        box=(left, top, left + box_width, top + box_height),
+        reducing_gap=2.0,
+    )
+
+
+def load_and_fit(data: bytes) -> Image.Image:
+    """Decode photo bytes and fit them to 1080x1920 (resize_and_crop).
+
+    JPEGs are decoded in draft mode, letting libjpeg downscale by 1/2, 1/4
+    or 1/8 during the IDCT while staying at least as large as the fill size.
+    A 12-48 MP phone photo is then never materialized at full resolution.
+    """
+    img = Image.open(io.BytesIO(data))
+    scale = _fill_scale(img.width, img.height)
+    img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    return resize_and_crop(img.convert("RGB"))
 
 
 def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> list[str]:
-    """Word-wrap text to fit within max_width pixels."""
-    words = text.split()
+    """Word-wrap text to fit within max_width pixels.
+
+    Greedy line breaking over cached per-word advances: each word is measured
+    once per font, so wrapping is linear in the caption length.
+    """
+    font_path, px_size = font.path, font.size
+    space = _advance(font_path, px_size, " ")
     lines: list[str] = []
-    current_line = ""
+    current: list[str] = []
+    current_width = 0.0
 
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        bbox = font.getbbox(test_line)
-        line_width = bbox[2] - bbox[0]
+    for word in text.split():
+        word_width = _advance(font_path, px_size, word)
+        test_width = current_width + space + word_width if current else word_width
 
-        if line_width <= max_width:
-            current_line = test_line
+        if test_width <= max_width:
+            current.append(word)
+            current_width = test_width
         else:
-            if current_line:
-                lines.append(current_line)
-            current_line = word
+            if current:
+                lines.append(" ".join(current))
+            current = [word]
+            current_width = word_width
 
-    if current_line:
-        lines.append(current_line)
+    if current:
+        lines.append(" ".join(current))
 
     return lines
 
 
-def render_caption(
-    img: Image.Image,
+@lru_cache(maxsize=1024)
+def layout_caption(
     caption: str,
     font_path: str,
     font_size: str = "medium",
     position: str = "center",
-) -> Image.Image:
-    """Render caption text on an already-resized 1080x1920 image.
+) -> CaptionLayout:
+    """Wrap and position a caption on the 1080x1920 canvas (memoized)."""
+    with _FONT_LOCK:
+        return _layout_caption(caption, font_path, font_size, position)
 
-    Args:
-        img: Source PIL Image (should already be 1080x1920 RGB).
-        caption: Text to overlay.
-        font_path: Path to .ttf font file.
-        font_size: One of "small", "medium", "large".
-        position: Vertical placement -- "top", "center", or "bottom".
-
-    Returns:
-        PIL Image with caption rendered on it.
-    """
-    img = img.copy()
-    draw = ImageDraw.Draw(img)
 
+def _layout_caption(
+    caption: str,
+    font_path: str,
+    font_size: str,
+    position: str,
+) -> CaptionLayout:
     px_size = FONT_SIZES.get(font_size, 80)
-    font = ImageFont.truetype(font_path, px_size)
+    font = load_font(font_path, px_size)
 
     max_text_width = int(TARGET_WIDTH * 0.9)
     clean_caption = strip_emojis(caption.upper())
     lines = wrap_text(clean_caption, font, max_text_width)
 
-    # Calculate total text block height
-    line_heights = []
-    for line in lines:
-        bbox = font.getbbox(line)
-        line_heights.append(bbox[3] - bbox[1])
+    # Measure each line once: ink height for stacking, width for centering
+    bboxes = [font.getbbox(line) for line in lines]
+    line_heights = [bbox[3] - bbox[1] for bbox in bboxes]
 
     line_spacing = int(px_size * 0.2)
     total_text_height = sum(line_heights) + line_spacing * max(len(lines) - 1, 0)
@@ -138,22 +198,96 @@ def render_caption(
     else:  # center
         y_start = (TARGET_HEIGHT - total_text_height) // 2
 
-    # Draw each line centered horizontally
+    # Center each line horizontally
+    placed = []
     y = y_start
-    for i, line in enumerate(lines):
-        bbox = font.getbbox(line)
-        line_width = bbox[2] - bbox[0]
-        x = (TARGET_WIDTH - line_width) // 2
+    for line, bbox, height in zip(lines, bboxes, line_heights):
+        x = (TARGET_WIDTH - (bbox[2] - bbox[0])) // 2
+        placed.append((line, x, y))
+        y += height + line_spacing
 
+    return CaptionLayout(lines=tuple(placed), px_size=px_size)
+
+
+@lru_cache(maxsize=64)
+def caption_sprite(
+    caption: str,
+    font_path: str,
+    font_size: str = "medium",
+    position: str = "center",
+) -> CaptionSprite | None:
+    """Rasterize a caption once into a tight RGBA sprite (memoized).
+
+    Returns None for captions with nothing to draw (e.g. emoji-only).
+    """
+    with _FONT_LOCK:
+        return _caption_sprite(caption, font_path, font_size, position)
+
+
+def _caption_sprite(
+    caption: str,
+    font_path: str,
+    font_size: str,
+    position: str,
+) -> CaptionSprite | None:
+    layout = layout_caption(caption, font_path, font_size, position)
+    if not layout.lines:
+        return None
+    font = load_font(font_path, layout.px_size)
+
+    # Union of the stroked ink boxes of all lines, in canvas coordinates
+    boxes = []
+    for line, x, y in layout.lines:
+        l, t, r, b = font.getbbox(line, stroke_width=STROKE_WIDTH)
+        boxes.append((x + l, y + t, x + r, y + b))
+    left = min(b[0] for b in boxes)
+    top = min(b[1] for b in boxes)
+    right = max(b[2] for b in boxes)
+    bottom = max(b[3] for b in boxes)
+
+    sprite = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    for line, x, y in layout.lines:
         draw.text(
-            (x, y),
+            (x - left, y - top),
             line,
             font=font,
             fill="white",
-            stroke_width=3,
+            stroke_width=STROKE_WIDTH,
             stroke_fill="black",
         )
 
-        y += line_heights[i] + line_spacing
+    return CaptionSprite(image=sprite, x=left, y=top)
+
+
+def render_caption(
+    img: Image.Image,
+    caption: str,
+    font_path: str,
+    font_size: str = "medium",
+    position: str = "center",
+    inplace: bool = False,
+) -> Image.Image:
+    """Render caption text on an already-resized 1080x1920 image.
+
+    Args:
+        img: Source PIL Image (should already be 1080x1920 RGB).
+        caption: Text to overlay.
+        font_path: Path to .ttf font file.
+        font_size: One of "small", "medium", "large".
+        position: Vertical placement -- "top", "center", or "bottom".
+        inplace: Composite onto img itself instead of a copy. Only the
+            sprite's bounding box is touched.
+
+    Returns:
+        PIL Image with caption rendered on it.
+    """
+    if not inplace:
+        img = img.copy()
+
+    sprite = caption_sprite(caption, font_path, font_size, position)
+    if sprite is not None:
+        # paste() with the sprite as its own mask alpha-blends within the box
+        img.paste(sprite.image, (sprite.x, sprite.y), sprite.image)
 
     return img
@@ -0,0 +1,4 @@
+-- Stable per-job variant index, so a retried job upserts its variant rows
+-- instead of inserting duplicates
+ALTER TABLE variants ADD COLUMN variant_index INT;
+CREATE UNIQUE INDEX idx_variants_job_id_variant_index ON variants(job_id, variant_index);
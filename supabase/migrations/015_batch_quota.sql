@@ -0,0 +1,50 @@
+-- Batch faceswap jobs consume one quota unit per source image: the quota
+-- functions take an amount, and a failed job refunds what it consumed
+
+DROP FUNCTION IF EXISTS try_consume_quota(UUID);
+DROP FUNCTION IF EXISTS refund_quota(UUID);
+
+CREATE OR REPLACE FUNCTION try_consume_quota(p_user_id UUID, p_amount INT DEFAULT 1)
+RETURNS boolean AS $$
+DECLARE
+  consumed boolean;
+BEGIN
+  UPDATE profiles
+  SET quota_used = quota_used + p_amount
+  WHERE id = p_user_id
+    AND quota_used + p_amount <= monthly_quota
+  RETURNING true INTO consumed;
+
+  RETURN COALESCE(consumed, false);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION refund_quota(p_user_id UUID, p_amount INT DEFAULT 1)
+RETURNS void AS $$
+BEGIN
+  UPDATE profiles
+  SET quota_used = GREATEST(quota_used - p_amount, 0)
+  WHERE id = p_user_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Quota units a job consumed: one per source image for batch faceswaps
+CREATE OR REPLACE FUNCTION job_quota_units(p_job_type TEXT, p_settings JSONB)
+RETURNS INT AS $$
+  SELECT CASE
+    WHEN p_job_type = 'faceswap' AND jsonb_typeof(p_settings->'images') = 'array'
+      THEN GREATEST(jsonb_array_length(p_settings->'images'), 1)
+    ELSE 1
+  END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION on_job_completed()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.status = 'failed' AND OLD.status = 'processing' THEN
+    -- Refund the quota credits since processing failed
+    PERFORM refund_quota(NEW.user_id, job_quota_units(NEW.job_type, NEW.settings));
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;